@@ -1,23 +1,29 @@
 import json
 from dataclasses import dataclass, field
+from pathlib import Path
 import random
 from statistics import fmean
+import sys
 from pygame import Vector2
 from pygame.examples.moveit import WIDTH
 from vi import Agent, Config, Simulation, Window, HeadlessSimulation
 from vi.util import count, probability
-SIMULATION_NUM = 1
 
-datapoints_collection = {
+sys.path.append(str(Path(__file__).resolve().parent.parent / "Common"))
+from ensemble import run_replicas
+from fsm_engine import AggregationEngine
+from neighbor_cache import any_closer_than, nearest_distances, use_neighbor_cache
+from scheduler import use_active_set
+from site_index import site_bounds, use_site_index
+from site_recorder import SiteRecorder
+from site_store import write_site_counts
+from stop_conditions import AllOnOneSite, should_stop
 
-}
+REPLICAS = 30
+AGENTS = 50
+# (image, center_x, center_y) of every site, in spawn order.
+SITE_SPAWNS = [("../images/site_fill.png", 200, 400), ("../images/site_fill.png", 600, 400)]
 
-datapoints ={
-    0 : {
-        'site_0': 0,
-        'site_1': 0,
-    }
-}
 
 sites = {
     0: {
@@ -35,6 +41,7 @@ sites = {
         "image": "images/site_2.png"
     }
 }
+SITE_BOUNDS = site_bounds(sites)  # (left, top, right, bottom) of every site, computed once
 
 @dataclass
 class AggregationConfig(Config):
@@ -44,45 +51,30 @@ class AggregationConfig(Config):
     movement_speed : float = 5.0
     #seed : int = 1
     duration : int = 5001
+    engine : str = "agents"  # "agents" or "numpy" (vectorised AggregationEngine, see fsm_engine.py)
+    fast_forward : bool = True  # numpy engine: jump over ticks on which every agent rests and none can leave
+    sample_every : int = 100  # ticks between two site occupancy samples
+    stop_on_consensus : bool = True  # end the run once all agents stayed on one site for consensus_samples samples
+    consensus_samples : int = 5
+    site_index : bool = True  # classify all agents onto sites once per tick (see site_index.py)
+    active_set : bool = True  # still agents skip their updates until their wait runs out (see scheduler.py)
+    neighbor_cache : bool = True  # compute each agent's neighbours at most once per tick
+    report : bool = False  # print the neighbour cache, site index and scheduler counters after each replica
     window : Window = field(default_factory=lambda: Window(width=800, height=800))
 
 
 class AggregationAgent(Agent[AggregationConfig]):
+    # The same for every agent, so one list on the class instead of one per agent.
+    possible_directions = ['N', 'NE', 'E', 'SE', 'S', 'SW', 'W', 'NW']
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.state = "wander"  # Initial state
-        self.possible_directions = ['N', 'NE', 'E', 'SE', 'S', 'SW', 'W', 'NW']
         self.direction = self.select_random_direction()
         self.ticks = 0
         self.next_tick_update = 0
         self.wait_still = 100
         self.wait_passed = 0
-        self.total_ticks = 0
-
-
-    def check_on_which_site(self):
-        if self.on_site():
-            site_id = self.on_site_id()
-            return site_id
-
-
-    def update_datapoints(self):
-        # check if key for current tick exists in datapoints
-
-        if self.total_ticks not in datapoints:
-            datapoints[self.total_ticks] = {
-                'site_0': 0,
-                'site_1': 0,
-            }
-        site_id = self.check_on_which_site()
-        if site_id is not None:
-            datapoints[self.total_ticks][f'site_{site_id}'] += 1
-
-        if self.total_ticks == 5000:
-            if SIMULATION_NUM not in datapoints_collection:
-                datapoints_collection[SIMULATION_NUM] = {}
-            datapoints_collection[SIMULATION_NUM] = datapoints
-
 
 
     def update_next_tick(self):
@@ -111,6 +103,14 @@ class AggregationAgent(Agent[AggregationConfig]):
                 return Vector2(-1, -1)
 
 
+    def on_site_id(self) -> int | None:
+        if self.config.site_index:
+            return self.shared.site_index.site_id(self)
+        return super().on_site_id()
+
+    def on_site(self) -> bool:
+        return self.on_site_id() is not None
+
     def detect_aggregation_site(self) -> bool:
         return self.on_site()
 
@@ -134,31 +134,20 @@ class AggregationAgent(Agent[AggregationConfig]):
 
     def check_collision_with_agents(self):
         # Check if the agent is colliding with any other agents
-        distance_to_others = [self.pos.distance_to(other_agent.pos) for other_agent in self.in_proximity_performance()]
-
-        for distance in distance_to_others:
-            if distance < 14:  # Assuming a collision threshold of 10 pixels
-                return True
-        return False
+        return any_closer_than(self, 14)  # Assuming a collision threshold of 10 pixels
 
     def site_boundries(self):
         site_id = self.on_site_id()
         if site_id is None:
             return None
-        site = sites[site_id]
-        return {
-            "left": site["center_x"] - site["width"] / 2,
-            "right": site["center_x"] + site["width"] / 2,
-            "top": site["center_y"] - site["height"] / 2,
-            "bottom": site["center_y"] + site["height"] / 2
-        }
+        return SITE_BOUNDS[site_id]
 
     def within_site_boundries(self):
         boundaries = self.site_boundries()
         if boundaries is None:
             return False
-        return (boundaries["left"] <= self.pos.x <= boundaries["right"] and
-                boundaries["top"] <= self.pos.y <= boundaries["bottom"])
+        left, top, right, bottom = boundaries
+        return left <= self.pos.x <= right and top <= self.pos.y <= bottom
 
 
     def choose_direction_to_stay_within_site(self):
@@ -166,14 +155,15 @@ class AggregationAgent(Agent[AggregationConfig]):
         if boundaries is None:
             return Vector2(0, 0)
 
+        left, top, right, bottom = boundaries
         directions = []
-        if self.pos.x <= boundaries["left"]:
+        if self.pos.x <= left:
             directions.append(Vector2(1, 0))
-        elif self.pos.x >= boundaries["right"]:
+        elif self.pos.x >= right:
             directions.append(Vector2(-1, 0))
-        if self.pos.y <= boundaries["top"]:
+        if self.pos.y <= top:
             directions.append(Vector2(0, 1))
-        elif self.pos.y >= boundaries["bottom"]:
+        elif self.pos.y >= bottom:
             directions.append(Vector2(0, -1))
 
         return random.choice(directions) if directions else Vector2(0, 0)
@@ -193,9 +183,7 @@ class AggregationAgent(Agent[AggregationConfig]):
 
 
     def join_loop(self):
-        distances_from_others = [dist for _, dist in self.in_proximity_accuracy()]
-        distances_from_others.sort()
-        frst_five = distances_from_others[:5]  # Get the first five distances
+        frst_five = nearest_distances(self, 5)  # Get the first five distances
         if  len(frst_five) == 0:
             avg_distance_from_others = 100
         else:
@@ -227,6 +215,19 @@ class AggregationAgent(Agent[AggregationConfig]):
                 self.state = "leave"
                 self.direction = self.select_random_direction()
 
+        if self.state == "still" and self.config.active_set:
+            # Until the wait runs out an update would only count it down, so sleep until then.
+            self.shared.scheduler.rest(self, self.wait_still - self.wait_passed)
+
+    def wake(self, skipped: int):
+        # Called by the scheduler: catch up on the updates skipped while resting.
+        self.wait_passed += skipped
+        ticks = self.ticks + skipped
+        while ticks >= self.next_tick_update:
+            ticks -= self.next_tick_update
+            self.update_next_tick()
+            self.direction = self.select_random_direction()
+        self.ticks = ticks
 
 
     def leave_loop(self):
@@ -239,11 +240,7 @@ class AggregationAgent(Agent[AggregationConfig]):
         self.there_is_no_escape()
 
     def update(self):
-        self.total_ticks += 1
         self.ticks +=1
-        if self.total_ticks % 100 == 0:
-
-            self.update_datapoints()
         if self.ticks >= self.next_tick_update:
             self.update_next_tick()
             self.direction = self.select_random_direction()
@@ -260,27 +257,70 @@ class AggregationAgent(Agent[AggregationConfig]):
         if self.state == "leave":
             self.leave_loop()
 
+class AggregationSimulation(HeadlessSimulation[AggregationConfig]):
+    # Counts the agents on every site once per `sample_every` ticks, instead of each agent counting itself.
+    def __init__(self, config: AggregationConfig):
+        super().__init__(config)
+        self.site_index = use_site_index(self)
+        self.recorder = SiteRecorder(config.sample_every, config.duration)
+        self.stop_conditions = []
+        """Checked after every sample; the run stops once one of them holds (see stop_conditions.py)."""
+
+    def before_update(self):
+        super().before_update()
+        if self.shared.counter == 0:
+            self.recorder.record(0, self.site_index)
+
+    def after_update(self):
+        super().after_update()
+        # Tick n is sampled after the n-th update of every agent.
+        tick = self.shared.counter + 1
+        if self.recorder.due(tick):
+            self.recorder.record(tick, self.site_index)
+            if should_stop(self.stop_conditions, self.recorder):
+                self.stop()
+
+
+def run_replica(replica: int, seed: int) -> tuple[SiteRecorder, dict | None]:
+    # One simulation; returns the recorder of its site occupancy samples
+    # and where and when it converged ({'tick': t, 'site': id}, None if it didn't).
+    config = AggregationConfig(seed=seed)
+    convergence = AllOnOneSite(AGENTS, config.consensus_samples)
+    stop_conditions = [convergence] if config.stop_on_consensus else []
+    if config.engine == "numpy":
+        engine = AggregationEngine.spawn(config, AGENTS, SITE_SPAWNS, SITE_BOUNDS, "../images/triangle.png", seed=seed)
+        recorder = SiteRecorder(config.sample_every, config.duration)
+        engine.run(config.duration, recorder, stop_conditions)
+        return recorder, convergence.result()
+
+    simulation = AggregationSimulation(config)
+    simulation.stop_conditions.extend(stop_conditions)
+    if config.neighbor_cache:
+        use_neighbor_cache(simulation)
+    if config.active_set:
+        use_active_set(simulation)
+    for image, x, y in SITE_SPAWNS:
+        simulation.spawn_site(image, x, y)
+    simulation.batch_spawn_agents(AGENTS, AggregationAgent, images=["images/triangle.png"]).run()
+    if config.report:
+        if config.neighbor_cache:
+            print(f'simulation {replica}:', simulation.shared.neighbor_cache.report())
+        if config.site_index:
+            print(f'simulation {replica}:', simulation.site_index.report())
+        if config.active_set:
+            print(f'simulation {replica}:', simulation.shared.scheduler.report())
+    return simulation.recorder, convergence.result()
+
+
 def run_sim():
-    global datapoints, SIMULATION_NUM
-    for i in range(30):
-        (
-            HeadlessSimulation(AggregationConfig())
-            .spawn_site("../images/site_fill.png", 200, 400)
-            .spawn_site("../images/site_fill.png", 600, 400)
-            .batch_spawn_agents(50, AggregationAgent, images=["images/triangle.png"])
-            .run()
-        )
-        SIMULATION_NUM +=1
-        datapoints = {
-            0: {
-                'site_0': 0,
-                'site_1': 0,
-            }
-        }
-
-
-    with open('../Predator_Prey_Simple/datapoints_30_symm.json', 'w') as f:
-        json.dump(datapoints_collection, f, indent=4)
+    # The replicas run in parallel, one per core; each gets its own seed derived from base_seed.
+    results = run_replicas(run_replica, REPLICAS, base_seed=0)
+    recorders = {replica: recorder for replica, (recorder, _) in results.items()}
+    convergence = {replica: reached for replica, (_, reached) in results.items()}
+
+    write_site_counts('../Predator_Prey_Simple/datapoints_30_symm.arrow', recorders)
+    with open('../Predator_Prey_Simple/convergence_30_symm.json', 'w') as f:
+        json.dump(convergence, f, indent=4)
 
 if __name__ == "__main__":
     run_sim()
@@ -1,11 +1,17 @@
 from dataclasses import dataclass, field
+from pathlib import Path
 import random
 from statistics import fmean
+import sys
 from pygame import Vector2
 from pygame.examples.moveit import WIDTH
 from vi import Agent, Config, Simulation, Window
 from vi.util import count, probability
 
+sys.path.append(str(Path(__file__).resolve().parent.parent / "Common"))
+from neighbor_cache import use_neighbor_cache
+from site_index import site_bounds, use_site_index
+
 sites = {
     0: {
         "width": 200,
@@ -15,6 +21,7 @@ sites = {
         "image": "images/site_fill.png"
     }
 }
+SITE_BOUNDS = site_bounds(sites)  # (left, top, right, bottom) of every site, computed once
 
 @dataclass
 class AggregationConfig(Config):
@@ -24,15 +31,20 @@ class AggregationConfig(Config):
     movement_speed : float = 20.0
     seed : int = 1
     duration : int = 0
+    site_index : bool = True  # classify all agents onto sites once per tick (see site_index.py)
+    neighbor_cache : bool = True  # compute each agent's neighbours at most once per tick
+    report : bool = False  # print the neighbour cache counters after the run
 
     window : Window = field(default_factory=lambda: Window(width=800, height=800))
 
 
 class AggregationAgent(Agent[AggregationConfig]):
+    # The same for every agent, so one list on the class instead of one per agent.
+    possible_directions = ['N', 'NE', 'E', 'SE', 'S', 'SW', 'W', 'NW']
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.state = "wander"  # Initial state
-        self.possible_directions = ['N', 'NE', 'E', 'SE', 'S', 'SW', 'W', 'NW']
         self.direction = self.select_random_direction()
         self.ticks = 0
         self.next_tick_update = 0
@@ -63,6 +75,14 @@ class AggregationAgent(Agent[AggregationConfig]):
                 return Vector2(-1, -1)
 
 
+    def on_site_id(self) -> int | None:
+        if self.config.site_index:
+            return self.shared.site_index.site_id(self)
+        return super().on_site_id()
+
+    def on_site(self) -> bool:
+        return self.on_site_id() is not None
+
     def detect_aggregation_site(self) -> bool:
         return self.on_site()
 
@@ -98,20 +118,14 @@ class AggregationAgent(Agent[AggregationConfig]):
         site_id = self.on_site_id()
         if site_id is None:
             return None
-        site = sites[site_id]
-        return {
-            "left": site["center_x"] - site["width"] / 2,
-            "right": site["center_x"] + site["width"] / 2,
-            "top": site["center_y"] - site["height"] / 2,
-            "bottom": site["center_y"] + site["height"] / 2
-        }
+        return SITE_BOUNDS[site_id]
 
     def within_site_boundries(self):
         boundaries = self.site_boundries()
         if boundaries is None:
             return False
-        return (boundaries["left"] <= self.pos.x <= boundaries["right"] and
-                boundaries["top"] <= self.pos.y <= boundaries["bottom"])
+        left, top, right, bottom = boundaries
+        return left <= self.pos.x <= right and top <= self.pos.y <= bottom
 
 
     def choose_direction_to_stay_within_site(self):
@@ -119,14 +133,15 @@ class AggregationAgent(Agent[AggregationConfig]):
         if boundaries is None:
             return Vector2(0, 0)
 
+        left, top, right, bottom = boundaries
         directions = []
-        if self.pos.x < boundaries["left"]:
+        if self.pos.x < left:
             directions.append(Vector2(1, 0))
-        elif self.pos.x > boundaries["right"]:
+        elif self.pos.x > right:
             directions.append(Vector2(-1, 0))
-        if self.pos.y < boundaries["top"]:
+        if self.pos.y < top:
             directions.append(Vector2(0, 1))
-        elif self.pos.y > boundaries["bottom"]:
+        elif self.pos.y > bottom:
             directions.append(Vector2(0, -1))
 
         return random.choice(directions) if directions else Vector2(0, 0)
@@ -205,12 +220,20 @@ class AggregationAgent(Agent[AggregationConfig]):
 
 
 def run_sim():
+    config = AggregationConfig()
+    simulation = Simulation(config)
+    if config.neighbor_cache:
+        use_neighbor_cache(simulation)
+    if config.site_index:
+        use_site_index(simulation)
     (
-        Simulation(AggregationConfig())
+        simulation
         .spawn_site("../images/site_fill.png", 400, 400)
         .batch_spawn_agents(50, AggregationAgent, images=["images/triangle.png"])
         .run()
     )
+    if config.report and config.neighbor_cache:
+        print(simulation.shared.neighbor_cache.report())
 
 if __name__ == "__main__":
     run_sim()
\ No newline at end of file
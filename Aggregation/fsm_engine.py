@@ -0,0 +1,338 @@
+"""Vectorised state machine for the two-site aggregation models.
+
+`AggregationAgent.update` runs the wander/join/still/leave machine one agent at
+a time and dispatches on string states. `AggregationEngine` keeps every agent's
+state in arrays instead: `state` as int8 codes (in the order of
+`AggregationAgent.state`), the timers `ticks`, `next_tick_update` and
+`wait_passed` as int32, and positions and headings as `(n, 2)` floats. Each tick
+applies every state's rule to the masked subset of agents in that state.
+
+Resting (`still`) agents cost nothing between their leave draws: a `TimerWheel`
+hands them back when their wait runs out. They don't move either, so they get
+their own KD-tree, rebuilt only when an agent settles or leaves. Only the
+moving agents' tree is rebuilt every tick, and neighbour queries ask both.
+
+Once every agent rests, nothing moves until one of them leaves, and each
+one's neighbour count (so its leave probability) is fixed. With
+`config.fast_forward` the engine then jumps straight to the next tick on which
+an agent that can leave draws; agents with more than 10 neighbours never leave
+(`p_leave` is below the floor), so a fully aggregated swarm jumps to the end of
+the run, one sample at a time.
+
+The rules are those of `aggregation_2_zone.py` / `Agg2Symm.py`:
+
+- wander: on a site, join with probability `1 - p_leave`; move along the heading;
+- join: settle (`still`) when the five nearest neighbours are on average closer
+  than 40, none is closer than 14, and the agent is within the site's bounds;
+  otherwise give up after 100 ticks or step back towards the bounds;
+- still: every `WAIT_STILL` ticks, leave with probability `p_leave`;
+- leave: move along a new heading, and wander again once off the site on a
+  tick that is a multiple of 50;
+
+with `p_leave = 1 / n` for `n` neighbours within `radius` (1 without any), and
+0 below the 0.1 floor. Agents that never stood still also get Violet's
+`change_position`: they drift one more step along their heading and turn by up
+to 10 degrees on a quarter of the ticks.
+
+The behaviour is statistically equivalent, not identical, to the agents':
+the engine draws from its own NumPy generator and updates all agents from the
+same start-of-tick neighbour positions instead of one after the other.
+"""
+from __future__ import annotations
+
+from pathlib import Path
+import sys
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / "Common"))
+from scheduler import TimerWheel
+from site_index import opaque_box
+from stop_conditions import should_stop
+
+WANDER, JOIN, STILL, LEAVE = range(4)
+
+# Headings in the order of AggregationAgent.possible_directions (not normalised, as there).
+DIRECTIONS = np.array([(0, -1), (1, -1), (1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1)], dtype=np.float64)
+
+WAIT_STILL = 100  # ticks between two leave draws of a resting agent
+JOIN_TIMEOUT = 100  # a joining agent that can't settle wanders again at this tick
+LEAVE_EVERY = 50  # a leaving agent off the site wanders again on ticks that are a multiple of this
+SETTLE_DISTANCE = 40  # mean distance to the five nearest neighbours below which an agent may settle
+COLLISION_DISTANCE = 14
+
+
+class AggregationEngine:
+    def __init__(self, config, pos: np.ndarray, sites: np.ndarray, bounds: np.ndarray, agent_box: np.ndarray,
+                 seed: int | None = None):
+        self.config = config
+        self.rng = np.random.default_rng(seed)
+        n = len(pos)
+
+        self.pos = np.ascontiguousarray(pos, dtype=np.float64).reshape(-1, 2)
+        self.direction = DIRECTIONS[self.rng.integers(0, len(DIRECTIONS), n)]
+        self.moving = np.ones(n, dtype=bool)
+        """False once an agent has stood still: Violet's `change_position` no longer moves it."""
+        self.state = np.full(n, WANDER, dtype=np.int8)
+        self.ticks = np.zeros(n, dtype=np.int32)
+        self.next_tick_update = np.zeros(n, dtype=np.int32)
+        self.wait_passed = np.zeros(n, dtype=np.int32)
+        """Up to date when an agent settles and when its wait runs out; not counted while it rests."""
+        self.wheel = TimerWheel(2 ** int(np.ceil(np.log2(WAIT_STILL + 1))))
+
+        self.sites = np.asarray(sites, dtype=np.float64).reshape(-1, 4)
+        """Opaque box `(left, top, right, bottom)` of each site, for on-site tests."""
+        self.bounds = np.asarray(bounds, dtype=np.float64).reshape(-1, 4)
+        """Box each site keeps its joining agents in (the models' `sites` table)."""
+        self.agent_box = np.asarray(agent_box, dtype=np.float64)
+        """Opaque box of the agent image relative to its rounded centre."""
+        self.ids = np.arange(len(self.sites))
+
+        self.width, self.height = (float(size) for size in config.window.as_tuple())
+        self.counter = 0
+        self._moving = self._resting = np.empty(0, dtype=np.int64)
+        self._moving_tree = self._resting_tree = None
+        self.resting_rebuilds = 0
+        self.skipped = 0
+
+    @classmethod
+    def spawn(cls, config, count: int, sites: list[tuple[str, float, float]],
+              bounds: dict[int, tuple[float, float, float, float]], agent_image: str,
+              seed: int | None = None) -> AggregationEngine:
+        """`count` agents at random positions, with sites given as `(image, x, y)` in spawn order."""
+        rng = np.random.default_rng(seed)
+        left, top, right, bottom = opaque_box(agent_image)
+        width, height = config.window.as_tuple()
+        # Fully inside the window, as batch_spawn_agents places them.
+        pos = rng.uniform((-left, -top), (width - right, height - bottom), size=(count, 2))
+        site_boxes = [opaque_box(image, (x, y)) for image, x, y in sites]
+        return cls(config, pos, site_boxes, [bounds[site_id] for site_id in sorted(bounds)],
+                   (left, top, right, bottom), seed=rng.integers(2 ** 63))
+
+    def __len__(self) -> int:
+        return len(self.pos)
+
+    def on_site(self, agents: np.ndarray) -> np.ndarray:
+        """Row of the site each of `agents` (indices) is on, -1 for none; the first site wins."""
+        boxes = np.tile(np.round(self.pos[agents]), 2) + self.agent_box
+        sites = self.sites
+        overlap = ((boxes[:, None, 0] < sites[None, :, 2]) & (sites[None, :, 0] < boxes[:, None, 2])
+                   & (boxes[:, None, 1] < sites[None, :, 3]) & (sites[None, :, 1] < boxes[:, None, 3]))
+        return np.where(overlap.any(axis=1), overlap.argmax(axis=1), -1)
+
+    def classify(self) -> np.ndarray:
+        # Same interface as SiteIndex.classify, so a SiteRecorder can record from the engine.
+        return self.on_site(np.arange(len(self.pos)))
+
+    def _index(self) -> None:
+        # This tick's positions, like Violet's proximity engine; the resting agents' tree is kept
+        # as long as the same agents rest, as none of them has moved.
+        resting = self.state == STILL
+        if self._resting_tree is None or not np.array_equal(np.flatnonzero(resting), self._resting):
+            self._resting = np.flatnonzero(resting)
+            self._resting_tree = cKDTree(self.pos[self._resting])
+            self.resting_rebuilds += 1
+        self._moving = np.flatnonzero(~resting)
+        self._moving_tree = cKDTree(self.pos[self._moving])
+
+    def _trees(self):
+        return [(tree, members) for tree, members in ((self._moving_tree, self._moving),
+                                                      (self._resting_tree, self._resting)) if len(members)]
+
+    def neighbour_counts(self, agents: np.ndarray) -> np.ndarray:
+        # Agents within `radius` of each of `agents`, itself excluded.
+        points = self.pos[agents]
+        counts = np.zeros(len(agents), dtype=np.int64)
+        for tree, _ in self._trees():
+            counts += tree.query_ball_point(points, self.config.radius, return_length=True)
+        return counts - 1
+
+    def prob_leave(self, agents: np.ndarray) -> np.ndarray:
+        neighbours = self.neighbour_counts(agents)
+        prob = 1 / np.maximum(neighbours, 1)
+        prob[prob < 0.1] = 0
+        return prob
+
+    def nearest_distances(self, agents: np.ndarray, k: int) -> np.ndarray:
+        """Distances to the `k` nearest other agents within `radius`, ascending; `inf` where there are fewer."""
+        found = [np.full((len(agents), k), np.inf)]
+        for tree, members in self._trees():
+            dist, index = tree.query(self.pos[agents], k=k + 1, distance_upper_bound=self.config.radius)
+            dist = dist.reshape(len(agents), k + 1)
+            index = index.reshape(len(agents), k + 1)
+            hit = index < len(members)
+            other = np.where(hit, members[np.where(hit, index, 0)], -1)
+            # Drop the agent itself, which may have moved away from its place in the tree.
+            dist[other == agents[:, None]] = np.inf
+            found.append(dist)
+        return np.sort(np.hstack(found), axis=1)[:, :k]
+
+    def _rest(self, agents: np.ndarray, wake_at: np.ndarray) -> None:
+        for tick in np.unique(wake_at).tolist():
+            self.wheel.schedule(tick, agents[wake_at == tick])
+
+    def _rotate(self, agents: np.ndarray, degrees: np.ndarray) -> None:
+        angle = np.radians(degrees)
+        cos, sin = np.cos(angle), np.sin(angle)
+        x, y = self.direction[agents, 0], self.direction[agents, 1]
+        self.direction[agents] = np.column_stack((x * cos - y * sin, x * sin + y * cos))
+
+    def there_is_no_escape(self, agents: np.ndarray) -> np.ndarray:
+        # Vectorised `Agent.there_is_no_escape`; returns which of `agents` wrapped around.
+        x = self.pos[agents, 0]
+        y = self.pos[agents, 1]
+        wrapped = (x < 0) | (x > self.width) | (y < 0) | (y > self.height)
+        x = np.where(x < 0, self.width, np.where(x > self.width, 0, x))
+        y = np.where(y < 0, self.height, np.where(y > self.height, 0, y))
+        self.pos[agents] = np.column_stack((x, y))
+        return wrapped
+
+    def change_position(self) -> None:
+        # Violet's own movement step, for agents that were never frozen.
+        moving = np.flatnonzero(self.moving)
+        wrapped = self.there_is_no_escape(moving)
+        turn = self.rng.uniform(-30, 30, len(moving))
+        self._rotate(moving[wrapped], turn[wrapped])
+        change = self.rng.random(len(moving)) < 0.25
+        turn = self.rng.uniform(-10, 10, len(moving))
+        self._rotate(moving[change], turn[change])
+        self.pos[moving] += self.direction[moving]
+
+    def stay_within(self, agents: np.ndarray, site: np.ndarray) -> np.ndarray:
+        # Vectorised `choose_direction_to_stay_within_site`: one unit step back towards the bounds.
+        left, top, right, bottom = self.bounds[site].T
+        x, y = self.pos[agents, 0], self.pos[agents, 1]
+        dx = np.where(x <= left, 1.0, np.where(x >= right, -1.0, 0.0))
+        dy = np.where(y <= top, 1.0, np.where(y >= bottom, -1.0, 0.0))
+        # With both axes out of bounds, one of the two is picked at random.
+        both = (dx != 0) & (dy != 0)
+        horizontal = self.rng.random(len(agents)) < 0.5
+        dx[both & ~horizontal] = 0
+        dy[both & horizontal] = 0
+        step = np.column_stack((dx, dy))
+        step[site < 0] = 0
+        return step
+
+    def _advance_timers(self, ticks: int) -> None:
+        # `ticks` steps' worth of `ticks += 1` and redraws at `next_tick_update`, for every agent at once.
+        self.ticks += ticks
+        while True:
+            expired = np.flatnonzero(self.ticks >= self.next_tick_update)
+            if not len(expired):
+                return
+            self.ticks[expired] -= self.next_tick_update[expired]
+            self.next_tick_update[expired] = self.rng.integers(100, 201, len(expired))
+            self.direction[expired] = DIRECTIONS[self.rng.integers(0, len(DIRECTIONS), len(expired))]
+
+    def fast_forward(self, limit: int) -> int:
+        """Skip up to `limit` ticks if every agent rests and none can leave before then; return how many.
+
+        The skipped ticks only advance the timers. Agents that cannot leave keep
+        drawing "stay" on their due ticks, so those draws are skipped too.
+        """
+        if limit <= 0 or (self.state != STILL).any():
+            return 0
+        self._index()
+        can_leave = self.prob_leave(np.arange(len(self.pos))) > 0
+
+        target = self.counter + limit
+        for tick in range(self.counter, target):
+            due = self.wheel.pop(tick)
+            if not due:
+                continue
+            due = np.concatenate(due)
+            if can_leave[due].any():
+                self.wheel.schedule(tick, due)
+                target = tick
+                break
+            self.wait_passed[due] = 0
+            self.wheel.schedule(tick + WAIT_STILL, due)
+
+        skipped = target - self.counter
+        self._advance_timers(skipped)
+        self.counter = target
+        self.skipped += skipped
+        return skipped
+
+    def step(self) -> None:
+        """Advance every agent by one tick."""
+        rng = self.rng
+        speed = self.config.movement_speed
+        self.change_position()
+        self._index()
+
+        self.ticks += 1
+        expired = np.flatnonzero(self.ticks >= self.next_tick_update)
+        self.ticks[expired] = 0
+        self.next_tick_update[expired] = rng.integers(100, 201, len(expired))
+        self.direction[expired] = DIRECTIONS[rng.integers(0, len(DIRECTIONS), len(expired))]
+
+        wander = np.flatnonzero(self.state == WANDER)
+        candidates = wander[self.on_site(wander) >= 0]
+        prob_join = 1 - self.prob_leave(candidates)
+        self.state[candidates[prob_join > rng.random(len(candidates))]] = JOIN
+        self.pos[wander] += self.direction[wander] * speed
+        self.there_is_no_escape(wander)
+
+        join = np.flatnonzero(self.state == JOIN)
+        nearest = self.nearest_distances(join, 5)
+        found = np.isfinite(nearest)
+        found_count = found.sum(axis=1)
+        average = np.where(found_count > 0, np.where(found, nearest, 0).sum(axis=1) / np.maximum(found_count, 1), 100)
+        site = self.on_site(join)
+        settle = (average < SETTLE_DISTANCE) & (nearest[:, 0] >= COLLISION_DISTANCE) & (site >= 0)
+        left, top, right, bottom = self.bounds[site].T
+        x, y = self.pos[join, 0], self.pos[join, 1]
+        within = settle & (left <= x) & (x <= right) & (top <= y) & (y <= bottom)
+        settled = join[within]
+        self.state[settled] = STILL
+        self.moving[settled] = False
+        give_up = ~settle & (self.ticks[join] == JOIN_TIMEOUT)
+        self.state[join[give_up]] = WANDER
+        steer = ~settle & ~give_up
+        self.pos[join[steer]] += self.stay_within(join[steer], site[steer]) * speed
+        self.there_is_no_escape(join[steer])
+
+        # A settled agent rests until its wait has counted up to WAIT_STILL, then draws whether to leave.
+        self.wait_passed[settled] += 1
+        self._rest(settled, self.counter + WAIT_STILL - self.wait_passed[settled])
+        due = np.sort(np.concatenate([np.empty(0, dtype=np.int64), *self.wheel.pop(self.counter)]))
+        prob_leave = self.prob_leave(due)
+        self.wait_passed[due] = 0
+        stays = prob_leave <= rng.random(len(due))
+        leaving = due[~stays]
+        self.state[leaving] = LEAVE
+        self.direction[leaving] = DIRECTIONS[rng.integers(0, len(DIRECTIONS), len(leaving))]
+        self._rest(due[stays], np.full(np.count_nonzero(stays), self.counter + WAIT_STILL))
+
+        leave = np.flatnonzero(self.state == LEAVE)
+        off_site = self.on_site(leave) < 0
+        self.state[leave[off_site & (self.ticks[leave] % LEAVE_EVERY == 0)]] = WANDER
+        self.pos[leave] += self.direction[leave] * speed
+        self.there_is_no_escape(leave)
+
+        self.counter += 1
+
+    def run(self, ticks: int, recorder=None, stop_conditions=()) -> AggregationEngine:
+        """Step `ticks` times; a `SiteRecorder` samples tick 0 and every due tick after it.
+
+        The run ends early after a sample on which one of `stop_conditions` holds.
+        With `config.fast_forward`, quiescent stretches are skipped up to the next
+        sample; as no agent moved, the sample is the same as if they had been stepped.
+        """
+        if recorder is not None and self.counter == 0:
+            recorder.record(0, self)
+        fast_forward = getattr(self.config, "fast_forward", False)
+        end = self.counter + ticks
+        while self.counter < end:
+            limit = end - self.counter
+            if recorder is not None:
+                limit = min(limit, recorder.every - self.counter % recorder.every)
+            if not (fast_forward and self.fast_forward(limit)):
+                self.step()
+            if recorder is not None and recorder.due(self.counter):
+                recorder.record(self.counter, self)
+                if should_stop(stop_conditions, recorder):
+                    break
+        return self
@@ -1,19 +1,23 @@
-import json
+from pathlib import Path
+import sys
 import matplotlib.pyplot as plt
-from collections import Counter
 import numpy as np
-from scipy import stats
 
-def plot_datapoints_from_json(json_path):
-    with open(json_path, 'r') as f:
-        data = json.load(f)
+sys.path.append(str(Path(__file__).resolve().parent.parent / "Common"))
+from convergence import convergence, summary
+from site_store import load_site_counts
 
-    ticks = sorted(int(k) for k in data.keys())
-    site_0 = [data[str(tick)]['site_0'] for tick in ticks]
-    site_1 = [data[str(tick)]['site_1'] for tick in ticks]
+AGENTS = 50
+STREAK = 5  # samples in a row on one site, 500 ticks at the default sample_every
 
-    plt.plot(ticks, site_0, label='site_0')
-    plt.plot(ticks, site_1, label='site_1')
+def plot_datapoints(counts, sim=None):
+    # One simulation's occupancy over time; the first one by default.
+    row = 0 if sim is None else int(np.searchsorted(counts.sims, sim))
+    grid = counts.array()[row]
+    sampled = (grid >= 0).all(axis=1)
+
+    for column, site_id in enumerate(counts.site_ids):
+        plt.plot(counts.ticks[sampled], grid[sampled, column], label=f'site_{site_id}')
     plt.xlabel('Ticks')
     plt.ylabel('Amount of agents')
     plt.title('Site Data Over Time')
@@ -21,103 +25,56 @@ def plot_datapoints_from_json(json_path):
     plt.show()
 
 
-def average_aggregation_tick(json_path):
-    with open(json_path, 'r') as f:
-        data = json.load(f)
+def first_full_ticks(counts, site_id=0):
+    # Per simulation, the first sampled tick with every agent on the site (simulations that never get there left out).
+    return convergence(counts, AGENTS, samples=1, sites=[site_id]).reached()
 
-    ticks_to_aggregate = []
 
-    for sim, ticks in data.items():
-        for tick_str, sites in sorted(ticks.items(), key=lambda x: int(x[0])):
-            if sites.get('site_0', 0) == 50:
-                ticks_to_aggregate.append(int(tick_str))
-                break  # Only the first occurrence per simulation
+def average_aggregation_tick(counts):
+    ticks_to_aggregate = first_full_ticks(counts)
 
-    if ticks_to_aggregate:
-        avg_tick = sum(ticks_to_aggregate) / len(ticks_to_aggregate)
-        min_tick = min(ticks_to_aggregate)
-        max_tick = max(ticks_to_aggregate)
-        print(f'Average tick: {avg_tick}')
-        print(f'Minimum tick: {min_tick}')
-        print(f'Maximum tick: {max_tick}')
+    if len(ticks_to_aggregate):
+        print(f'Average tick: {ticks_to_aggregate.mean()}')
+        print(f'Minimum tick: {ticks_to_aggregate.min()}')
+        print(f'Maximum tick: {ticks_to_aggregate.max()}')
     else:
         print('No simulation reached full aggregation on site_0.')
 
-def aggregation_stats(json_path):
-    with open(json_path, 'r') as f:
-        data = json.load(f)
-
-    ticks_to_aggregate = []
-
-    for sim, ticks in data.items():
-        for tick_str, sites in sorted(ticks.items(), key=lambda x: int(x[0])):
-            if sites.get('site_0', 0) == 50:
-                ticks_to_aggregate.append(int(tick_str))
-                break
+def aggregation_stats(counts):
+    ticks_array = first_full_ticks(counts)
 
-    if not ticks_to_aggregate:
+    if not len(ticks_array):
         print('No simulation reached full aggregation on site_0.')
         return
 
-    ticks_array = np.array(ticks_to_aggregate)
-    mean = np.mean(ticks_array)
-    std = np.std(ticks_array, ddof=1)
-
-    # z-scores for each simulation
-    z_scores = (ticks_array - mean) / std
-
-    # One-sample t-test: is the mean significantly different from a reference value (e.g., 0)?
-    t_stat, p_value = stats.ttest_1samp(ticks_array, 0)
-
-    print(f'Average tick: {mean}')
-    print(f'Standard deviation: {std}')
-    print(f'Z-scores: {z_scores}')
-    print(f'T-statistic: {t_stat}')
-    print(f'P-value: {p_value}')
-
-def find_full_aggregation_ticks(json_path):
-    with open(json_path, 'r') as f:
-        data = json.load(f)
-
-    ticks_to_aggregate = []
-
-    for sim, ticks in data.items():
-        sorted_ticks = sorted((int(t), v['site_0']) for t, v in ticks.items())
-        streak = 0
-        streak_start = None
-        for tick, count in sorted_ticks:
-            if count == 50:
-                if streak == 0:
-                    streak_start = tick
-                streak += 100
-                if streak == 500:
-                    ticks_to_aggregate.append(streak_start)
-                    break
-            else:
-                streak = 0
-                streak_start = None
-
-    return ticks_to_aggregate
-
-def aggregation_stats_and_plot(json_path):
-    ticks_to_aggregate = find_full_aggregation_ticks(json_path)
-    if not ticks_to_aggregate:
+    # z-scores for each simulation, and a one-sample t-test: is the mean significantly different from 0?
+    result = summary(ticks_array)
+
+    print(f'Average tick: {result["mean"]}')
+    print(f'Standard deviation: {result["std"]}')
+    print(f'Z-scores: {result["z_scores"]}')
+    print(f'T-statistic: {result["t_stat"]}')
+    print(f'P-value: {result["p_value"]}')
+
+def find_full_aggregation_ticks(counts):
+    # Per simulation, the first tick of STREAK samples in a row with every agent on site_0.
+    return convergence(counts, AGENTS, STREAK, sites=[0]).reached()
+
+def aggregation_stats_and_plot(counts):
+    ticks_to_aggregate = find_full_aggregation_ticks(counts)
+    if not len(ticks_to_aggregate):
         print('No simulation reached full aggregation on site_0.')
         return
 
-    ticks_array = np.array(ticks_to_aggregate)
-    mean = np.mean(ticks_array)
-    std = np.std(ticks_array, ddof=1)
-    z_scores = (ticks_array - mean) / std
-    t_stat, p_value = stats.ttest_1samp(ticks_array, 0)
+    result = summary(ticks_to_aggregate)
 
-    print(f'Average tick: {mean}')
-    print(f'Standard deviation: {std}')
-    print(f'Minimum tick: {min(ticks_array)}')
-    print(f'Maximum tick: {max(ticks_array)}')
-    print(f'Z-scores: {z_scores}')
-    print(f'T-statistic: {t_stat}')
-    print(f'P-value: {p_value}')
+    print(f'Average tick: {result["mean"]}')
+    print(f'Standard deviation: {result["std"]}')
+    print(f'Minimum tick: {result["min"]}')
+    print(f'Maximum tick: {result["max"]}')
+    print(f'Z-scores: {result["z_scores"]}')
+    print(f'T-statistic: {result["t_stat"]}')
+    print(f'P-value: {result["p_value"]}')
 
     plt.hist(ticks_to_aggregate, bins=50, edgecolor='black')
     plt.xlabel('Ticks to full aggregation (streak start)')
@@ -125,19 +82,14 @@ def aggregation_stats_and_plot(json_path):
     plt.title('Distribution of Aggregation Times (500-tick streak)')
     plt.show()
 
-# Usage
-if __name__ == "__main__":
-    aggregation_stats_and_plot('datapoints_30.json')
-
-
-
-if __name__ == "__main__":
-    aggregation_stats('datapoints_30.json')
-
+# Usage: the store is memory-mapped once and shared by every analysis.
 if __name__ == "__main__":
-    average_aggregation_tick('datapoints_30.json')
+    counts = load_site_counts('datapoints_30.arrow')
+    aggregation_stats_and_plot(counts)
+    aggregation_stats(counts)
+    average_aggregation_tick(counts)
 
 
 
 
-#plot_datapoints_from_json('datapoints_2_symm.json')
\ No newline at end of file
+#plot_datapoints(load_site_counts('datapoints_2_symm.arrow'))
@@ -1,55 +1,32 @@
-import json
+from pathlib import Path
+import sys
 import numpy as np
 import matplotlib.pyplot as plt
-from scipy import stats
 
-def find_full_aggregation_ticks(json_path):
-    with open(json_path, 'r') as f:
-        data = json.load(f)
+sys.path.append(str(Path(__file__).resolve().parent.parent / "Common"))
+from convergence import convergence, summary
+from site_store import load_site_counts
 
-    ticks_to_aggregate = []
-    for sim, ticks in data.items():
-        sorted_ticks = sorted((int(t), v) for t, v in ticks.items())
-        streak_0 = streak_1 = 0
-        streak_start_0 = streak_start_1 = None
-        for tick, counts in sorted_ticks:
-            # Site 0
-            if counts['site_0'] == 50:
-                if streak_0 == 0:
-                    streak_start_0 = tick
-                streak_0 += 100
-                if streak_0 == 500:
-                    ticks_to_aggregate.append(streak_start_0)
-                    break
-            else:
-                streak_0 = 0
-                streak_start_0 = None
-            # Site 1
-            if counts['site_1'] == 50:
-                if streak_1 == 0:
-                    streak_start_1 = tick
-                streak_1 += 100
-                if streak_1 == 500:
-                    ticks_to_aggregate.append(streak_start_1)
-                    break
-            else:
-                streak_1 = 0
-                streak_start_1 = None
-    return ticks_to_aggregate
+AGENTS = 50
+STREAK = 5  # samples in a row on one site, 500 ticks at the default sample_every
 
-def plot_aggregation_stats(json_path):
-    ticks = find_full_aggregation_ticks(json_path)
-    if not ticks:
+def find_full_aggregation_ticks(counts):
+    # Per simulation, the first tick of STREAK samples in a row with every agent on site_0 or site_1,
+    # whichever streak completes first (site_0 on a tie).
+    return convergence(counts, AGENTS, STREAK, sites=[0, 1]).reached()
+
+def plot_aggregation_stats(path):
+    counts = load_site_counts(path)
+    ticks = find_full_aggregation_ticks(counts)
+    if not len(ticks):
         print('No simulation reached full aggregation on site_0 or site_1.')
         return
 
-    arr = np.array(ticks)
-    mean = np.mean(arr)
-    std = np.std(arr, ddof=1)
-    z_scores = (arr - mean) / std
-    t_stat, p_value = stats.ttest_1samp(arr, 0)
-    min_tick = np.min(arr)
-    max_tick = np.max(arr)
+    arr = ticks
+    result = summary(arr)
+    mean, std, z_scores = result["mean"], result["std"], result["z_scores"]
+    t_stat, p_value = result["t_stat"], result["p_value"]
+    min_tick, max_tick = arr.min(), arr.max()
 
     # Print stats
     print(f'Average tick: {mean}')
@@ -76,4 +53,4 @@ def plot_aggregation_stats(json_path):
     plt.show()
 
 # Usage
-plot_aggregation_stats('../Predator_Prey_Simple/datapoints_30_symm.json')
\ No newline at end of file
+plot_aggregation_stats('../Predator_Prey_Simple/datapoints_30_symm.arrow')
@@ -0,0 +1,59 @@
+"""Age-dependent probabilities looked up in a table instead of computed per call.
+
+`Predator.calculate_hunt_success` and `Prey.calculate_breeding_chance` in the
+extended predator-prey model evaluate a Gaussian bell over age with `math.exp`,
+`math.sqrt` and `round` every time an agent asks. The only input that varies
+is the agent's integer age, which lies in `[0, max_age]`. So the model's
+probabilities are a table of `max_age + 1` entries. `gaussian_age_table` builds
+it with the same formula, so every entry is exactly what the method returned,
+and caches it for each `(max_age, peak)`: the table is rebuilt only when those
+config values change.
+
+Agents look up their age with `probability(age)`. A vectorised engine draws for
+a whole population at once with `draw(ages, rng)`.
+"""
+from __future__ import annotations
+
+from functools import lru_cache
+import math
+
+import numpy as np
+
+
+class AgeTable:
+    def __init__(self, values: list[float]):
+        self.values = values
+        """Probability at every age from 0 to `max_age`, as Python floats."""
+        self.array = np.array(values + [0.0], dtype=np.float64)
+        """The same, with one extra 0 that every age out of range is mapped to."""
+        self.max_age = len(values) - 1
+
+    def probability(self, age: int) -> float:
+        return self.values[age] if 0 <= age <= self.max_age else 0.0
+
+    def lookup(self, ages: np.ndarray) -> np.ndarray:
+        ages = np.asarray(ages)
+        out_of_range = (ages < 0) | (ages > self.max_age)
+        return self.array[np.where(out_of_range, len(self.values), ages)]
+
+    def draw(self, ages: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+        """One success draw per age, all at once: True with the probability of that age."""
+        return self.lookup(ages) > rng.random(len(ages))
+
+
+@lru_cache
+def gaussian_age_table(max_age: int, peak: float = 1.0) -> AgeTable:
+    """`peak` times a bell over `[0, max_age]`, 1 at `max_age / 2`, rounded to 4 decimals; 0 everywhere without ages."""
+    if max_age <= 0:
+        return AgeTable([0.0] * (max(max_age, 0) + 1))
+
+    # Mean at the midpoint of max_age; standard deviation max_age/4 for a reasonable spread.
+    mean = max_age / 2
+    std_dev = max_age / 4
+    coefficient = 1 / (std_dev * math.sqrt(2 * math.pi))
+    values = []
+    for age in range(max_age + 1):
+        exponent = -((age - mean) ** 2) / (2 * std_dev ** 2)
+        # Scaled to `peak` at the mean, where the bell's value is `coefficient`.
+        values.append(round(coefficient * math.exp(exponent) / coefficient * peak, 4))
+    return AgeTable(values)
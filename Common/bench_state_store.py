@@ -0,0 +1,124 @@
+"""Memory per agent: Violet agent objects against the array engines.
+
+Spawns `--agents` agents of each class into a `HeadlessSimulation` and reports
+the bytes allocated per agent (measured with `tracemalloc`), next to the bytes
+per agent of the engine that runs the same model on arrays (its per-agent
+arrays, with the spare capacity of a `StateStore` included):
+
+    uv run bench_state_store.py --agents 20000
+
+Every variant runs in a fresh process. On Python 3.13 with 20000 agents:
+
+    class               bytes/agent (objects)   bytes/agent (arrays)   engine
+    Prey                                 691                     74   PredatorPreyEngine
+    Predator                             707                     80   PredatorPreyEngine
+    AggregationAgent                     771                     46   AggregationEngine
+    FlockingAgent                        659                     32   BoidsEngine
+
+The ~700 bytes per agent are Violet's: the sprite, the `pos`/`move` vectors,
+the rect and the mask. The model's own fields (`age`, `energy`, `ticks`, ...)
+are a small part of that. CPython 3.13 keeps instance attributes inline, 8
+bytes each, so moving them into typed columns behind a per-agent accessor
+doesn't make agents smaller: with a descriptor reading each field from a
+store column, Prey measured 707 -> 728 bytes, and every read created a new
+Python number. What saves memory is dropping the agent objects:
+the engines keep nothing but the arrays.
+"""
+import argparse
+import gc
+import importlib.util
+import multiprocessing
+from pathlib import Path
+import sys
+import tracemalloc
+
+from vi import HeadlessSimulation
+
+ROOT = Path(__file__).resolve().parent.parent
+IMAGES = ROOT / "images"
+
+
+def _load(path: Path):
+    # Some model scripts have dashes in their names, so load them by path.
+    spec = importlib.util.spec_from_file_location(path.stem.replace("-", "_"), path)
+    module = importlib.util.module_from_spec(spec)
+    sys.path.insert(0, str(path.parent))
+    spec.loader.exec_module(module)
+    return module
+
+
+def bytes_per_agent(config, agent_class, image: Path, count: int) -> float:
+    simulation = HeadlessSimulation(config)
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    simulation.batch_spawn_agents(count, agent_class, images=[str(image)])
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / count
+
+
+def engine_bytes_per_agent(case: str, count: int) -> float:
+    if case in ("Prey", "Predator"):
+        module = _load(ROOT / "Predator_Prey_Extended" / "pred-prey-simple-extended.py")
+        prey, predators = (count, 0) if case == "Prey" else (0, count)
+        engine = module.PredatorPreyEngine.spawn(module.PredatorPreyConfig(), prey, predators,
+                                                 str(IMAGES / "prey.png"), str(IMAGES / "predator.png"))
+        store = engine.prey if case == "Prey" else engine.predators
+        return store.nbytes() / count
+
+    if case == "AggregationAgent":
+        module = _load(ROOT / "Aggregation" / "aggregation_2_zone.py")
+        sites = [(str(IMAGES / Path(image).name), x, y) for image, x, y in module.SITE_SPAWNS]
+        engine = module.AggregationEngine.spawn(module.AggregationConfig(), count, sites, module.SITE_BOUNDS,
+                                                str(IMAGES / "triangle.png"))
+        arrays = (engine.pos, engine.direction, engine.moving, engine.state,
+                  engine.ticks, engine.next_tick_update, engine.wait_passed)
+        return sum(array.nbytes for array in arrays) / count
+
+    flocking = _load(ROOT / "Flocking" / "flocking.py")
+    engine = flocking.BoidsEngine.spawn(flocking.FlockingConfig(), count)
+    return (engine.pos.nbytes + engine.move.nbytes) / count
+
+
+def _measure(case: str, arrays: bool, count: int) -> float:
+    # Runs in a fresh process: CPython lays out instances after the first ones of a class,
+    # so measuring several cases in one process would skew the later ones.
+    if arrays:
+        return engine_bytes_per_agent(case, count)
+
+    script, config_name, class_name, image = CASES[case]
+    module = _load(ROOT / script)
+    config = getattr(module, config_name)()
+    return bytes_per_agent(config, getattr(module, class_name), IMAGES / image, count)
+
+
+CASES = {
+    "Prey": ("Predator_Prey_Extended/pred-prey-simple-extended.py", "PredatorPreyConfig", "Prey", "prey.png"),
+    "Predator": ("Predator_Prey_Extended/pred-prey-simple-extended.py", "PredatorPreyConfig", "Predator",
+                 "predator.png"),
+    "AggregationAgent": ("Aggregation/aggregation_2_zone.py", "AggregationConfig", "AggregationAgent",
+                         "triangle.png"),
+    "FlockingAgent": ("Flocking/flocking.py", "FlockingConfig", "FlockingAgent", "triangle.png"),
+}
+ENGINES = {"Prey": "PredatorPreyEngine", "Predator": "PredatorPreyEngine",
+           "AggregationAgent": "AggregationEngine", "FlockingAgent": "BoidsEngine"}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--agents", type=int, default=20_000)
+    args = parser.parse_args()
+
+    def measure(case, arrays):
+        with multiprocessing.get_context("spawn").Pool(1) as pool:
+            return pool.apply(_measure, (case, arrays, args.agents))
+
+    print(f"{'class':<18} {'bytes/agent (objects)':>23} {'bytes/agent (arrays)':>22}   engine")
+    for case in CASES:
+        print(f"{case:<18} {measure(case, False):>23.0f} {measure(case, True):>22.0f}   {ENGINES[case]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Per-tick position table of a few broadcasting agents.
+
+In `flocking_pred` every prey used to scan its whole neighbour list with
+`isinstance` checks to find the two predators among fifty prey. A
+`BroadcastTable` keeps the agents of interest (the predators) in a registry and
+copies their positions into one `(k, 2)` array once per tick, so finding the ones
+within a radius is a single vectorised distance check against that array,
+independent of the proximity engine and of how many prey there are.
+
+The positions are a snapshot taken the first time the table is queried in a tick.
+"""
+from __future__ import annotations
+
+import numpy as np
+
+
+class BroadcastTable:
+    def __init__(self, shared):
+        self.shared = shared
+        self.members = []
+        self.pos = np.empty((0, 2))
+        self._tick = None
+
+        self.queries = 0
+        self.detections = 0
+        """How many queries found at least one member in range."""
+
+    def register(self, agent) -> None:
+        self.members.append(agent)
+        self._tick = None
+
+    def refresh(self) -> None:
+        # Dead members drop out of the registry here.
+        self.members = [agent for agent in self.members if agent.is_alive()]
+        self.pos = np.array([(agent.pos.x, agent.pos.y) for agent in self.members], dtype=np.float64).reshape(-1, 2)
+        self._tick = self.shared.counter
+
+    def snapshot(self) -> tuple[list, np.ndarray]:
+        """Return `(members, pos)` as of this tick, refreshing them on the first call in a tick."""
+        if self._tick != self.shared.counter:
+            self.refresh()
+        return self.members, self.pos
+
+    def within(self, pos, radius: float) -> tuple[list, np.ndarray, np.ndarray]:
+        """Return `(members, diff, distances)` of the members closer than `radius` to `pos`.
+
+        `diff` is `pos - member.pos` as an `(m, 2)` array.
+        """
+        members, positions = self.snapshot()
+
+        self.queries += 1
+        diff = np.array((pos[0], pos[1])) - positions
+        dist = np.hypot(diff[:, 0], diff[:, 1])
+        hits = np.flatnonzero(dist < radius)
+        if len(hits):
+            self.detections += 1
+        return [members[k] for k in hits.tolist()], diff[hits], dist[hits]
+
+    def report(self, name: str = "broadcast table") -> str:
+        return f"{name}: {len(self.members)} members, {self.detections} of {self.queries} queries in range"
+
+
+def use_broadcast_table(simulation, name: str) -> BroadcastTable:
+    """Attach an empty `BroadcastTable` to the simulation as `simulation.shared.<name>`."""
+    table = BroadcastTable(simulation.shared)
+    setattr(simulation.shared, name, table)
+    return table
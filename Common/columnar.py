@@ -0,0 +1,133 @@
+"""Chunked columnar output.
+
+`ColumnarWriter` buffers rows column by column and writes every `chunk_rows`
+rows as the next numbered Parquet part in a directory (`part-00000.parquet`,
+`part-00001.parquet`, ...). Memory stays bounded however long the run, an
+interrupted run keeps every part written so far, and the whole directory reads
+back as one table with `scan`. A new writer replaces the parts of an earlier
+run in the same directory; with `append=True` it adds to them instead, for runs
+that resume where an earlier one stopped:
+
+    with ColumnarWriter("metrics") as writer:
+        writer.append(tick=0, polarization=0.93)
+
+    scan("metrics").filter(pl.col("tick") > 100).collect()
+"""
+from __future__ import annotations
+
+import os
+from pathlib import Path
+import shutil
+
+import numpy as np
+import polars as pl
+
+
+def _compaction_dirs(path: Path) -> tuple[Path, Path]:
+    # (merged part being written, old parts being swapped out) of a `compact` of `path`.
+    return path.with_name(path.name + ".compacting"), path.with_name(path.name + ".replaced")
+
+
+def _recover(path: str | Path) -> None:
+    """Finish or undo a `compact` of `path` that was cut short."""
+    path = Path(path)
+    merged, replaced = _compaction_dirs(path)
+    if not path.exists() and replaced.exists():
+        # Killed between the two renames. The merge was complete once the old parts were moved aside.
+        (merged if merged.exists() else replaced).rename(path)
+    # Whatever is left is an unfinished merge, or old parts already merged into `path`.
+    shutil.rmtree(merged, ignore_errors=True)
+    shutil.rmtree(replaced, ignore_errors=True)
+
+
+class ColumnarWriter:
+    def __init__(self, path: str | Path, chunk_rows: int = 10_000, compression: str = "zstd",
+                 append: bool = False):
+        self.path = Path(path)
+        _recover(self.path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.chunk_rows = chunk_rows
+        self.compression = compression
+
+        # Parts whose write was cut short; they never got their final name.
+        for partial in self.path.glob(".part-*.parquet.tmp"):
+            partial.unlink()
+        parts = sorted(self.path.glob("part-*.parquet"))
+        if not append:
+            # Rows of an earlier run would read back mixed in with this one's.
+            for part in parts:
+                part.unlink()
+            parts = []
+        self.parts = int(parts[-1].stem.removeprefix("part-")) + 1 if parts else 0
+        self.rows = 0
+        self._columns: dict[str, list] = {}
+        self._buffered = 0
+
+    def append(self, **row) -> None:
+        """Add one row; every row must have the same columns."""
+        self.extend({name: [value] for name, value in row.items()})
+
+    def extend(self, columns: dict) -> None:
+        """Add a batch of rows given as equally long columns (lists or NumPy arrays)."""
+        length = None
+        for name, values in columns.items():
+            values = values if isinstance(values, np.ndarray) else np.asarray(values)
+            if length is None:
+                length = len(values)
+            elif len(values) != length:
+                raise ValueError(f"column '{name}' has {len(values)} rows, expected {length}")
+            self._columns.setdefault(name, []).append(values)
+
+        self._buffered += length or 0
+        if self._buffered >= self.chunk_rows:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._buffered:
+            return
+
+        frame = pl.DataFrame({name: np.concatenate(chunks) for name, chunks in self._columns.items()})
+        # Written under a name `scan` skips, then renamed: a killed run never leaves a truncated part.
+        partial = self.path / f".part-{self.parts:05d}.parquet.tmp"
+        frame.write_parquet(partial, compression=self.compression)
+        os.replace(partial, self.path / f"part-{self.parts:05d}.parquet")
+        self.parts += 1
+        self.rows += self._buffered
+        self._columns = {}
+        self._buffered = 0
+
+    def compact(self) -> None:
+        """Flush, then merge all parts in the directory into a single `part-00000.parquet`.
+
+        The merged part is written to a sibling directory, which then takes the
+        place of this one; the old parts are deleted last. If the process dies
+        in between, the next writer on `path` finishes or undoes the swap
+        (`_recover`), so no row is lost or read twice.
+        """
+        self.flush()
+        parts = sorted(self.path.glob("part-*.parquet"))
+        if len(parts) < 2:
+            return
+
+        merged, replaced = _compaction_dirs(self.path)
+        shutil.rmtree(merged, ignore_errors=True)
+        merged.mkdir()
+        scan(self.path).collect().write_parquet(merged / "part-00000.parquet", compression=self.compression)
+        self.path.rename(replaced)
+        merged.rename(self.path)
+        shutil.rmtree(replaced)
+        self.parts = 1
+
+    def close(self) -> None:
+        self.flush()
+
+    def __enter__(self) -> ColumnarWriter:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def scan(path: str | Path) -> pl.LazyFrame:
+    """Lazily read every part a `ColumnarWriter` wrote to `path`, skipping parts still being written."""
+    return pl.scan_parquet(Path(path) / "part-*.parquet")
@@ -0,0 +1,110 @@
+"""When did each run of an aggregation ensemble converge, and summaries over all runs.
+
+A run has converged once every agent has been on one site for `samples`
+samples in a row (500 ticks at the default sampling interval). `plot.py` and
+`pscore.py` used to find that streak by walking each run's samples in Python.
+`first_streaks` finds it for every run and every site at once, from a
+`(sims, samples, sites)` count array. The length of the window ending at each
+sample is a difference of running totals, so the whole ensemble is one
+cumulative sum and one comparison.
+
+`convergence` runs it over a site store (see `site_store`) a chunk of runs at
+a time, so an ensemble larger than memory is streamed from the memory-mapped
+file. `summary` gives the mean / std / z-score / t-test figures the plots print:
+
+    counts = load_site_counts("datapoints_30.arrow")
+    result = convergence(counts, agents=50)
+    summary(result.reached())
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+import numpy as np
+from scipy import stats
+
+
+def first_streaks(counts: np.ndarray, agents: int, samples: int = 5) -> np.ndarray:
+    """Sample index at which each run's first streak of `samples` full samples starts, per site; -1 for none.
+
+    `counts` is `(sims, samples, sites)`; the result is `(sims, sites)`.
+    """
+    full = counts == agents
+    sims, length, sites = full.shape
+    if length < samples:
+        return np.full((sims, sites), -1, dtype=np.int64)
+
+    running = np.zeros((sims, length + 1, sites), dtype=np.int32)
+    np.cumsum(full, axis=1, out=running[:, 1:])
+    streak = (running[:, samples:] - running[:, :-samples]) == samples
+    found = streak.any(axis=1)
+    return np.where(found, streak.argmax(axis=1), -1)
+
+
+def earliest_streak(starts: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Per run, the start and column of the streak that starts first over all sites; -1 for neither.
+
+    On a tie the first column wins, as in `AllOnOneSite`.
+    """
+    never = np.iinfo(np.int64).max
+    masked = np.where(starts >= 0, starts, never)
+    column = masked.argmin(axis=1)
+    start = masked[np.arange(len(masked)), column]
+    reached = start != never
+    return np.where(reached, start, -1), np.where(reached, column, -1)
+
+
+@dataclass
+class Convergence:
+    sims: np.ndarray
+    tick: np.ndarray
+    """Tick at which the streak started, -1 for runs that never converged."""
+    site: np.ndarray
+    """Id of the site the run converged on, -1 for none."""
+
+    def reached(self) -> np.ndarray:
+        """Convergence ticks of the runs that converged."""
+        return self.tick[self.tick >= 0]
+
+
+def convergence(counts, agents: int, samples: int = 5, sites=None, chunk_sims: int = 1024) -> Convergence:
+    """Convergence of every run in a `SiteCounts` store, on any of `sites` (ids; all sites by default).
+
+    Runs are analysed `chunk_sims` at a time, so only that many runs' samples
+    are in memory at once.
+    """
+    results = []
+    for chunk in counts.chunks(chunk_sims):
+        site_ids = chunk.site_ids
+        grid = chunk.array()
+        if sites is not None:
+            columns = np.flatnonzero(np.isin(site_ids, sites))
+            grid, site_ids = grid[:, :, columns], site_ids[columns]
+        start, column = earliest_streak(first_streaks(grid, agents, samples))
+        reached = start >= 0
+        results.append((chunk.sims,
+                        np.where(reached, chunk.ticks[np.maximum(start, 0)], -1),
+                        np.where(reached, site_ids[np.maximum(column, 0)], -1)))
+
+    if not results:
+        empty = np.empty(0, dtype=np.int64)
+        return Convergence(empty, empty, empty)
+    return Convergence(*(np.concatenate(column) for column in zip(*results)))
+
+
+def summary(ticks: np.ndarray, reference: float = 0) -> dict:
+    """Mean, std (ddof=1), min, max, z-scores and a one-sample t-test against `reference` of convergence ticks."""
+    ticks = np.asarray(ticks, dtype=np.float64)
+    mean = ticks.mean()
+    std = ticks.std(ddof=1)
+    t_stat, p_value = stats.ttest_1samp(ticks, reference)
+    return {
+        "count": len(ticks),
+        "mean": mean,
+        "std": std,
+        "min": ticks.min(),
+        "max": ticks.max(),
+        "z_scores": (ticks - mean) / std,
+        "t_stat": t_stat,
+        "p_value": p_value,
+    }
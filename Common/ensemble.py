@@ -0,0 +1,81 @@
+"""Run independent replicas of a simulation on a process pool.
+
+The aggregation experiments run the same simulation 30 times. Back to back that
+takes 30 times as long as one run, and the runs shared module-level globals for
+their results. `run_replicas` runs each replica in a worker process instead,
+with its own derived seed, and collects whatever each replica returns:
+
+    def run_replica(replica: int, seed: int) -> SiteRecorder:
+        simulation = AggregationSimulation(AggregationConfig(seed=seed))
+        ...
+        simulation.batch_spawn_agents(AGENTS, AggregationAgent, images=[...]).run()
+        return simulation.recorder
+
+    results = run_replicas(run_replica, 30, base_seed=0)  # {1: SiteRecorder, 2: ..., ...}
+
+`run_replica` must be a module-level function so the workers can import it. It
+must also return its results, e.g. the recorder it attached to the simulation,
+rather than leave them in globals: a worker runs several replicas one after the
+other.
+
+Replica `i` always gets the same seed for the same `base_seed`, no matter which
+worker runs it or in what order, so an ensemble can be reproduced exactly.
+"""
+from __future__ import annotations
+
+import multiprocessing
+import os
+import time
+from typing import Any, Callable
+
+import numpy as np
+
+
+def replica_seed(base_seed: int, replica: int) -> int:
+    return int(np.random.SeedSequence([base_seed, replica]).generate_state(1)[0])
+
+
+def _run(task: tuple[Callable[[int, int], Any], int, int]) -> tuple[int, Any, float]:
+    run_replica, replica, seed = task
+    start = time.perf_counter()
+    result = run_replica(replica, seed)
+    return replica, result, time.perf_counter() - start
+
+
+def run_replicas(run_replica: Callable[[int, int], Any], count: int, base_seed: int = 0,
+                 workers: int | None = None, first: int = 1, verbose: bool = True) -> dict[int, Any]:
+    """Run replicas `first, ..., first + count - 1` and return `{replica: result}`, in replica order.
+
+    `workers` defaults to one per core (and never more than `count`); with
+    `workers=1` everything runs in this process.
+    """
+    tasks = [(run_replica, replica, replica_seed(base_seed, replica)) for replica in range(first, first + count)]
+    workers = min(workers or os.cpu_count() or 1, count)
+
+    results = {}
+    start = time.perf_counter()
+    if workers == 1:
+        finished = map(_run, tasks)
+    else:
+        pool = multiprocessing.Pool(workers)
+        finished = pool.imap_unordered(_run, tasks)
+    try:
+        for replica, result, seconds in finished:
+            results[replica] = result
+            if verbose:
+                print(f"replica {replica} done in {seconds:.1f}s ({len(results)}/{count})")
+    except BaseException:
+        # A failed replica or Ctrl-C: stop the others instead of waiting for them to finish.
+        if workers > 1:
+            pool.terminate()
+        raise
+    else:
+        if workers > 1:
+            pool.close()
+    finally:
+        if workers > 1:
+            pool.join()
+
+    if verbose:
+        print(f"{count} replicas on {workers} workers in {time.perf_counter() - start:.1f}s")
+    return dict(sorted(results.items()))
@@ -0,0 +1,68 @@
+"""Per-tick nearest-target lookup for a batch of seekers.
+
+`PredatorAgent` used to walk over its proximity neighbours and pick the closest
+prey with `min(..., key=...)`, allocating a `Vector2` per candidate. A
+`NearestIndex` builds a `scipy.spatial.cKDTree` over the target positions (the
+prey) once per tick and looks up the closest target within `radius` for every
+seeker (the predators) in one batched query, so each seeker's answer is a dict
+lookup: O(log n) per seeker, however many prey there are.
+
+Targets and seekers are both `BroadcastTable`s; the index uses their positions
+as of the first query in a tick.
+"""
+from __future__ import annotations
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from broadcast import BroadcastTable
+
+
+class NearestIndex:
+    def __init__(self, shared, targets: BroadcastTable, seekers: BroadcastTable, radius: float):
+        self.shared = shared
+        self.targets = targets
+        self.seekers = seekers
+        self.radius = radius
+
+        self._tick = None
+        self._tree = None
+        self._nearest = {}
+
+    def rebuild(self) -> None:
+        targets, target_pos = self.targets.snapshot()
+        seekers, seeker_pos = self.seekers.snapshot()
+        self._tick = self.shared.counter
+        self._nearest = {}
+        if len(targets) == 0:
+            self._tree = None
+            return
+
+        self._tree = cKDTree(target_pos)
+        if len(seekers):
+            # Misses come back with an infinite distance and index == len(targets).
+            distances, indices = self._tree.query(seeker_pos, k=1, distance_upper_bound=self.radius)
+            for seeker, distance, k in zip(seekers, distances.tolist(), indices.tolist()):
+                self._nearest[seeker] = targets[k] if distance != np.inf else None
+
+    def nearest(self, seeker):
+        """Return the target closest to `seeker` within `radius`, or `None`."""
+        if self._tick != self.shared.counter:
+            self.rebuild()
+        if self._tree is None:
+            return None
+
+        if seeker in self._nearest:
+            return self._nearest[seeker]
+
+        # Not a seeker at the start of this tick (e.g. just spawned): query on its own.
+        distance, k = self._tree.query((seeker.pos.x, seeker.pos.y), k=1, distance_upper_bound=self.radius)
+        return self.targets.members[k] if distance != np.inf else None
+
+
+def use_nearest_index(simulation, name: str, targets: BroadcastTable, seekers: BroadcastTable,
+                      radius: float) -> NearestIndex:
+    """Attach a `NearestIndex` to the simulation as `simulation.shared.<name>`."""
+    index = NearestIndex(simulation.shared, targets, seekers, radius)
+    setattr(simulation.shared, name, index)
+    return index
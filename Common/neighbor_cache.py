@@ -0,0 +1,113 @@
+"""Tick-scoped neighbour cache.
+
+Agents often ask for their neighbours more than once in the same tick:
+`FlockingAgent.change_position` used to call `in_proximity_performance` three
+times, and `AggregationAgent.join_loop` calls `in_proximity_accuracy` and then
+`check_collision_with_agents`, which queries again. `NeighborCache` sits between
+the agents and the simulation's proximity engine (Violet's chunks or a
+`SpatialHashProximity`) and computes every agent's neighbours, with distances,
+at most once per tick.
+
+Both query methods are answered from the same `in_proximity_accuracy` result, so
+through the cache `in_proximity_performance` only returns agents that are
+actually within `radius` (rather than everything in the same chunk).
+
+The cache empties itself whenever the proximity engine is updated or the
+simulation's tick counter moves on.
+
+`nearest_distances` and `any_closer_than` answer the two questions the
+aggregation rules ask about neighbours: the k nearest distances (a partial
+selection instead of sorting all of them), and whether any neighbour is closer
+than a threshold (which stops at the first one). Through the cache both read
+the same per-tick entry, so they cost no extra neighbour query.
+"""
+from __future__ import annotations
+
+import heapq
+
+
+class NeighborCache:
+    def __init__(self, inner, shared):
+        self.inner = inner
+        self.shared = shared
+        self._tick = None
+        self._entries = {}
+
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def radius(self):
+        return self.inner.radius
+
+    @property
+    def chunk_size(self):
+        return self.inner.chunk_size
+
+    def _set_radius(self, radius):
+        if radius != self.inner.radius:
+            self.invalidate()
+        self.inner._set_radius(radius)
+
+    def update(self):
+        self.inner.update()
+        self.invalidate()
+
+    def invalidate(self):
+        self._entries.clear()
+        self._tick = self.shared.counter
+
+    def neighbours(self, agent) -> list:
+        """Return `[(other, distance), ...]` for `agent`, computing it at most once per tick."""
+        if self._tick != self.shared.counter:
+            self.invalidate()
+
+        entry = self._entries.get(agent)
+        if entry is None:
+            self.misses += 1
+            entry = self._entries[agent] = list(self.inner.in_proximity_accuracy(agent))
+        else:
+            self.hits += 1
+        return entry
+
+    def in_proximity_accuracy(self, agent):
+        return iter(self.neighbours(agent))
+
+    def in_proximity_performance(self, agent):
+        return (other for other, _ in self.neighbours(agent))
+
+    def stats(self) -> dict[str, float]:
+        queries = self.hits + self.misses
+        return {
+            "queries": queries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / queries if queries else 0.0,
+        }
+
+    def report(self) -> str:
+        stats = self.stats()
+        return (f"neighbour cache: {stats['queries']} queries, {stats['hits']} hits, "
+                f"{stats['misses']} misses ({stats['hit_rate']:.0%} served from cache)")
+
+
+def use_neighbor_cache(simulation):
+    """Put a `NeighborCache` in front of the simulation's proximity engine.
+
+    Call this after `use_spatial_hash` if both are used. The cache is also
+    available as `simulation.shared.neighbor_cache`.
+    """
+    cache = NeighborCache(simulation._proximity, simulation.shared)
+    simulation._proximity = cache
+    simulation.shared.neighbor_cache = cache
+    return simulation
+
+
+def nearest_distances(agent, k: int) -> list[float]:
+    """The distances to `agent`'s `k` nearest neighbours within the radius, nearest first."""
+    return heapq.nsmallest(k, (distance for _, distance in agent.in_proximity_accuracy()))
+
+
+def any_closer_than(agent, threshold: float) -> bool:
+    """Whether a neighbour of `agent` is closer than `threshold`; stops at the first one found."""
+    return any(distance < threshold for _, distance in agent.in_proximity_accuracy())
@@ -0,0 +1,198 @@
+"""Population counts kept up to date as agents are born, age and die.
+
+The predator-prey scripts had every agent call `save_data('kind', ...)` and
+`save_data('age', ...)` on every tick. Counting a kind per frame then took a
+`group_by("frame")` over the whole snapshot table: one row per agent per
+frame, tens of millions of rows for 2000 prey over 20000 frames. Violet also
+keeps its own replay rows (id, x, y, image) for every agent in that table.
+
+A `PopulationCounter` keeps the population of every kind and an age histogram
+per kind instead. Agents that mix in `Counted` report their own births,
+deaths and birthdays, so nothing is recounted. Once per tick the counter closes
+one row per kind: the population and age histogram at the start of the tick
+(what the agents' `save_data` calls saw), and the births and deaths during it.
+
+    class Prey(Counted, Agent[PredatorPreyConfig]):
+        kind = "prey"
+
+    simulation = HeadlessSimulation(config).batch_spawn_agents(2000, Prey, images=[...])
+    population = use_population_counter(simulation, kinds=("prey", "predator"), max_age=12)
+    simulation.run()
+    population.frame()  # frame, kind, count, births, deaths, mean_age
+
+The counter closes its rows in the simulation's snapshot merge, which it takes
+over. Unless `keep_snapshots` is set, the per-agent snapshot rows are dropped
+there, so memory stays at a few arrays of (frames, kinds). With it, they go on
+to the metrics the counter took over from (Violet's own, or a `SnapshotSink`).
+"""
+from __future__ import annotations
+
+from collections import defaultdict
+
+import numpy as np
+import polars as pl
+from vi.metrics import Metrics
+
+
+class PopulationCounter:
+    def __init__(self, kinds: tuple[str, ...], max_age: int = 0, capacity: int = 1024):
+        self.kinds = tuple(kinds)
+        self._row_of = {kind: row for row, kind in enumerate(self.kinds)}
+        self.max_age = max_age
+        """Ages above this are counted in the last bin of the histogram."""
+
+        self.alive = np.zeros((len(self.kinds), max_age + 1), dtype=np.int64)
+        """Live agents of every kind, by age: the histogram as it is now."""
+        self._start = self.alive.copy()
+        self._births = np.zeros(len(self.kinds), dtype=np.int64)
+        self._deaths = np.zeros(len(self.kinds), dtype=np.int64)
+
+        self.frames = np.zeros(capacity, dtype=np.int64)
+        self.ages = np.zeros((capacity, len(self.kinds), max_age + 1), dtype=np.int32)
+        """Age histogram of every kind at the start of every recorded frame."""
+        self.births = np.zeros((capacity, len(self.kinds)), dtype=np.int32)
+        self.deaths = np.zeros((capacity, len(self.kinds)), dtype=np.int32)
+        self.samples = 0
+
+    def _bin(self, age) -> int:
+        return min(max(int(age), 0), self.max_age)
+
+    def born(self, kind: str, age: int = 0) -> None:
+        row = self._row_of[kind]
+        self.alive[row, self._bin(age)] += 1
+        self._births[row] += 1
+
+    def died(self, kind: str, age: int = 0) -> None:
+        row = self._row_of[kind]
+        self.alive[row, self._bin(age)] -= 1
+        self._deaths[row] += 1
+
+    def aged(self, kind: str, old: int, new: int) -> None:
+        row = self._row_of[kind]
+        self.alive[row, self._bin(old)] -= 1
+        self.alive[row, self._bin(new)] += 1
+
+    def observe(self, kind: str, ages: np.ndarray, births: int = 0, deaths: int = 0) -> None:
+        """Set a kind's population from the ages of all its live agents, for engines that keep agents in arrays."""
+        row = self._row_of[kind]
+        self.alive[row] = np.bincount(np.clip(ages, 0, self.max_age), minlength=self.max_age + 1)
+        self._births[row] += births
+        self._deaths[row] += deaths
+
+    def start(self) -> None:
+        """Take the population so far as the starting population, not as births."""
+        self._start = self.alive.copy()
+        self._births[:] = 0
+        self._deaths[:] = 0
+
+    def close(self, frame: int) -> None:
+        """Record `frame`: the population at its start, and the births and deaths since."""
+        if self.samples == len(self.frames):
+            self.frames = np.concatenate((self.frames, np.zeros_like(self.frames)))
+            self.ages = np.concatenate((self.ages, np.zeros_like(self.ages)))
+            self.births = np.concatenate((self.births, np.zeros_like(self.births)))
+            self.deaths = np.concatenate((self.deaths, np.zeros_like(self.deaths)))
+
+        self.frames[self.samples] = frame
+        self.ages[self.samples] = self._start
+        self.births[self.samples] = self._births
+        self.deaths[self.samples] = self._deaths
+        self.samples += 1
+        self.start()
+
+    def counts(self) -> np.ndarray:
+        """Population of every kind at the start of every recorded frame, `(frames, kinds)`."""
+        return self.ages[:self.samples].sum(axis=2)
+
+    def frame(self) -> pl.DataFrame:
+        """One row per (frame, kind): `count`, `births`, `deaths` and `mean_age`."""
+        ages = self.ages[:self.samples]
+        counts = ages.sum(axis=2)
+        total_age = (ages * np.arange(self.max_age + 1)).sum(axis=2)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean_age = total_age / counts
+        kinds = len(self.kinds)
+        return pl.DataFrame({
+            "frame": np.repeat(self.frames[:self.samples], kinds),
+            "kind": np.tile(np.array(self.kinds), self.samples),
+            "count": counts.ravel(),
+            "births": self.births[:self.samples].ravel(),
+            "deaths": self.deaths[:self.samples].ravel(),
+            "mean_age": mean_age.ravel(),
+        })
+
+    def nbytes(self) -> int:
+        return self.frames.nbytes + self.ages.nbytes + self.births.nbytes + self.deaths.nbytes
+
+
+class Counted:
+    """Agent mixin reporting births, deaths and birthdays to the simulation's `PopulationCounter`, if it has one.
+
+    Subclasses set `kind`. Agents are born at age 0; they age with `grow_older`.
+    """
+
+    kind: str = "agent"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        population = getattr(self.shared, "population", None)
+        if population is not None:
+            population.born(self.kind)
+
+    def grow_older(self, years: int = 1) -> None:
+        # An agent killed earlier in the tick still runs its update; it is no longer counted.
+        population = getattr(self.shared, "population", None)
+        if population is not None and self.is_alive():
+            population.aged(self.kind, self.age, self.age + years)
+        self.age += years
+
+    def kill(self) -> None:
+        population = getattr(self.shared, "population", None)
+        if population is not None and self.is_alive():
+            population.died(self.kind, getattr(self, "age", 0))
+        super().kill()
+
+
+class PopulationMetrics(Metrics):
+    """Violet's metrics, with the population counter's row closed at every snapshot merge.
+
+    The snapshot rows are passed on to `snapshots_to`, or dropped without it.
+    """
+
+    def __init__(self, population: PopulationCounter, shared, snapshots_to: Metrics | None = None):
+        super().__init__()
+        self.population = population
+        self.shared = shared
+        self.snapshots_to = snapshots_to
+        if snapshots_to is not None:
+            self.fps = snapshots_to.fps
+
+    def _merge(self) -> None:
+        self.population.close(self.shared.counter)
+        target = self.snapshots_to
+        if target is None:
+            self._temporary_snapshots.clear()
+            return
+
+        target._temporary_snapshots = self._temporary_snapshots
+        target._merge()
+        self._temporary_snapshots = defaultdict(list)
+        self.snapshots = target.snapshots
+
+
+def use_population_counter(simulation, kinds: tuple[str, ...], max_age: int = 0,
+                           keep_snapshots: bool = False) -> PopulationCounter:
+    """Count the simulation's `Counted` agents per kind, as `simulation.shared.population`.
+
+    Agents spawned so far make up the starting population. Without
+    `keep_snapshots`, `simulation.run().snapshots` stays empty.
+    """
+    population = PopulationCounter(kinds, max_age)
+    for agent in simulation._agents:
+        if isinstance(agent, Counted):
+            population.born(agent.kind, getattr(agent, "age", 0))
+    population.start()
+    simulation.shared.population = population
+    snapshots_to = simulation._metrics if keep_snapshots else None
+    simulation._metrics = PopulationMetrics(population, simulation.shared, snapshots_to)
+    return population
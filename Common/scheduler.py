@@ -0,0 +1,127 @@
+"""Active-set scheduling: resting agents leave the update list until a timer wakes them.
+
+Once an aggregation run converges, most agents are `still`. Their update only
+counts `wait_passed` up, and only every `wait_still` ticks does anything happen
+(a leave draw). Violet still calls every agent's `update` every tick.
+
+`ScheduledGroup` replaces the simulation's `_all` group. Its `update` calls only
+the active sprites. An agent that has nothing to do for a while calls
+`scheduler.rest(agent, ticks)`: it is skipped until `ticks` ticks from now, when
+a `TimerWheel` puts it back. On waking, its `wake(skipped)` method (if it has
+one) is told how many updates it missed, so it can catch its counters up in one
+step. A resting agent stays in `_agents`, so the proximity engine, site index
+and recorder still see it where it is. It is also still drawn.
+
+Only the updates and the site index's per-tick classification (see
+`site_index.py`) scale with the active agents. Violet still rebuilds its
+proximity chunks over every agent and loops over every agent to move it, so a
+tick of the agent model stays O(all agents), at a smaller constant. The
+vectorised `AggregationEngine` also keeps resting agents out of its per-tick
+neighbour tree.
+"""
+from __future__ import annotations
+
+import pygame as pg
+
+
+class TimerWheel:
+    """Items filed under the tick they are due, in `size` slots used round-robin.
+
+    Scheduling and popping a tick cost O(1) per item. Items due more than `size`
+    ticks ahead share a slot with nearer ones and are left in place until their turn.
+    """
+
+    def __init__(self, size: int = 128):
+        self.size = size
+        self.slots = [[] for _ in range(size)]
+        self.pending = 0
+
+    def __len__(self) -> int:
+        return self.pending
+
+    def schedule(self, tick: int, item) -> None:
+        self.slots[tick % self.size].append((tick, item))
+        self.pending += 1
+
+    def pop(self, tick: int) -> list:
+        """Remove and return the items due at (or before) `tick`, in the order they were scheduled."""
+        index = tick % self.size
+        slot = self.slots[index]
+        if not slot:
+            return []
+        due = [item for when, item in slot if when <= tick]
+        if len(due) == len(slot):
+            self.slots[index] = []
+        else:
+            self.slots[index] = [(when, item) for when, item in slot if when > tick]
+        self.pending -= len(due)
+        return due
+
+
+class ScheduledGroup(pg.sprite.Group):
+    """Sprite group whose `update` skips resting sprites."""
+
+    def __init__(self, shared, wheel_size: int = 128):
+        self.shared = shared
+        self.wheel = TimerWheel(wheel_size)
+        self.active = {}
+        self.resting = {}
+        """Resting sprite -> tick it went to rest."""
+
+        self.updates = 0
+        self.skipped = 0
+        super().__init__()
+
+    def add_internal(self, sprite, layer=None):
+        super().add_internal(sprite, layer)
+        if sprite not in self.resting:
+            self.active[sprite] = None
+
+    def remove_internal(self, sprite):
+        super().remove_internal(sprite)
+        self.active.pop(sprite, None)
+        self.resting.pop(sprite, None)
+
+    def rest(self, sprite, ticks: int) -> None:
+        """Skip `sprite`'s updates until `ticks` ticks from now (at least 1)."""
+        now = self.shared.counter
+        self.active.pop(sprite, None)
+        self.resting[sprite] = now
+        self.wheel.schedule(now + max(ticks, 1), sprite)
+
+    def wake_due(self) -> None:
+        now = self.shared.counter
+        for sprite in self.wheel.pop(now):
+            since = self.resting.pop(sprite, None)
+            if since is None:
+                # Removed from the group while resting.
+                continue
+            self.active[sprite] = None
+            skipped = now - since - 1
+            self.skipped += skipped
+            wake = getattr(sprite, "wake", None)
+            if wake is not None:
+                wake(skipped)
+
+    def update(self, *args, **kwargs):
+        self.wake_due()
+        # A copy: sprites may go to rest, die or be born during the loop.
+        for sprite in list(self.active):
+            self.updates += 1
+            sprite.update(*args, **kwargs)
+
+    def report(self) -> str:
+        total = self.updates + self.skipped
+        share = self.skipped / total if total else 0.0
+        return f"scheduler: {self.updates} updates run, {self.skipped} skipped while resting ({share:.0%})"
+
+
+def use_active_set(simulation, wheel_size: int = 128) -> ScheduledGroup:
+    """Replace the simulation's `_all` group with a `ScheduledGroup`, also available as `simulation.shared.scheduler`."""
+    group = ScheduledGroup(simulation.shared, wheel_size)
+    sprites = simulation._all.sprites()
+    simulation._all.empty()
+    group.add(*sprites)
+    simulation._all = group
+    simulation.shared.scheduler = group
+    return group
@@ -0,0 +1,171 @@
+"""Site geometry compiled once, and every agent's site classified once per tick.
+
+`Agent.on_site_id` tests the agent against every site with
+`pygame.sprite.collide_mask`, which builds the agent's mask from its image on
+every call. The aggregation agents ask several times per update (`on_site`,
+`on_site_id`, `site_boundries`), so a joining agent rebuilds its mask three or
+four times per tick.
+
+A `SiteIndex` compiles the sites once: their ids, the bounding boxes of their
+opaque pixels and their masks, as arrays. `classify` places a whole population
+in one batched call:
+
+* agents whose opaque box misses every site's box are on no site;
+* agents whose opaque box lies inside a fully opaque site's box are on it;
+* only the few agents straddling a site's edge get an exact mask test.
+
+So it answers exactly what `on_site_id` would, the first site winning when an
+agent touches two. `site_id(agent)` classifies all agents on the first query
+of a tick and serves later queries from that result. An agent that has moved
+since (the agents move one by one during the tick) is classified again alone.
+With an active-set scheduler (`scheduler.py`), only the active agents are
+classified on the first query: resting agents don't move, so their earlier
+answer still holds.
+
+Sites spawned later are picked up on the next query.
+"""
+from __future__ import annotations
+
+import numpy as np
+import pygame as pg
+
+
+def site_bounds(table: dict[int, dict]) -> dict[int, tuple[float, float, float, float]]:
+    """Compile a `{site_id: {"center_x", "center_y", "width", "height"}}` table to `(left, top, right, bottom)`."""
+    return {
+        site_id: (site["center_x"] - site["width"] / 2, site["center_y"] - site["height"] / 2,
+                  site["center_x"] + site["width"] / 2, site["center_y"] + site["height"] / 2)
+        for site_id, site in table.items()
+    }
+
+
+def _opaque_box(mask: pg.mask.Mask) -> tuple[int, int, int, int]:
+    # (left, top, right, bottom) of the set bits, relative to the mask's top-left corner.
+    rects = mask.get_bounding_rects()
+    if not rects:
+        return 0, 0, 0, 0
+    box = rects[0].unionall(rects[1:])
+    return box.left, box.top, box.right, box.bottom
+
+
+def opaque_box(image, center: tuple[float, float] = (0, 0)) -> tuple[float, float, float, float]:
+    """Box of the opaque pixels of `image` (a surface or a path) placed as Violet does, centred on `center`."""
+    if not isinstance(image, pg.Surface):
+        image = pg.image.load(image)
+    left, top, right, bottom = _opaque_box(pg.mask.from_surface(image))
+    x = round(center[0]) - image.get_width() // 2
+    y = round(center[1]) - image.get_height() // 2
+    return x + left, y + top, x + right, y + bottom
+
+
+class SiteIndex:
+    def __init__(self, sites, agents, shared):
+        self.sites = sites
+        self.agents = agents
+        self.shared = shared
+
+        self.ids = np.empty(0, dtype=np.int64)
+        """Site id of each row of the index, in the order `on_site_id` tests them."""
+        self.boxes = np.empty((0, 4))
+        """Opaque bounding box `(left, top, right, bottom)` of each site, in screen coordinates."""
+        self._corners = np.empty((0, 2))
+        self._masks = []
+        self._filled = np.empty(0, dtype=bool)
+        self._images = {}
+
+        self._tick = None
+        self._entries = {}
+
+        self.batches = 0
+        self.classified = 0
+        self.singles = 0
+        self.mask_tests = 0
+
+    def compile(self) -> None:
+        sites = self.sites.sprites()
+        self.ids = np.array([site.id for site in sites], dtype=np.int64)
+        self._masks = [site.mask for site in sites]
+        self._corners = np.array([(site.rect.x, site.rect.y) for site in sites], dtype=np.float64).reshape(-1, 2)
+        boxes = np.array([_opaque_box(mask) for mask in self._masks], dtype=np.float64).reshape(-1, 4)
+        self.boxes = boxes + np.tile(self._corners, 2)
+        self._filled = np.array([mask.count() == mask.get_size()[0] * mask.get_size()[1] for mask in self._masks],
+                                dtype=bool)
+
+    def _image(self, image):
+        entry = self._images.get(id(image))
+        if entry is None:
+            mask = pg.mask.from_surface(image)
+            # The image is kept in the entry so its id cannot be reused by another one.
+            entry = self._images[id(image)] = (image, mask, image.get_width() // 2, image.get_height() // 2,
+                                               _opaque_box(mask))
+        return entry
+
+    def classify(self, agents=None) -> np.ndarray:
+        """Return the row (into `ids`) of the site each agent is on, -1 for none. Defaults to all agents."""
+        if len(self.ids) != len(self.sites):
+            self.compile()
+        agents = self.agents.sprites() if agents is None else list(agents)
+        if not agents or not len(self.ids):
+            return np.full(len(agents), -1, dtype=np.int64)
+
+        images = [self._image(agent.image) for agent in agents]
+        rows = np.array([(agent.pos.x, agent.pos.y, half_w, half_h, *box)
+                         for agent, (_, _, half_w, half_h, box) in zip(agents, images)], dtype=np.float64)
+
+        # Top-left corner as in Agent.rect: centred on the rounded position.
+        corner = np.round(rows[:, :2]) - rows[:, 2:4]
+        boxes = rows[:, 4:] + np.tile(corner, 2)
+
+        sites = self.boxes
+        overlap = ((boxes[:, None, 0] < sites[None, :, 2]) & (sites[None, :, 0] < boxes[:, None, 2])
+                   & (boxes[:, None, 1] < sites[None, :, 3]) & (sites[None, :, 1] < boxes[:, None, 3]))
+        inside = ((sites[None, :, 0] <= boxes[:, None, 0]) & (boxes[:, None, 2] <= sites[None, :, 2])
+                  & (sites[None, :, 1] <= boxes[:, None, 1]) & (boxes[:, None, 3] <= sites[None, :, 3])
+                  & self._filled[None, :] & overlap)
+
+        on_site = inside
+        for agent_row, site_row in np.argwhere(overlap & ~inside):
+            self.mask_tests += 1
+            x, y = (corner[agent_row] - self._corners[site_row]).astype(int).tolist()
+            on_site[agent_row, site_row] = self._masks[site_row].overlap(images[agent_row][1], (x, y)) is not None
+
+        return np.where(on_site.any(axis=1), on_site.argmax(axis=1), -1)
+
+    def refresh(self) -> None:
+        scheduler = getattr(self.shared, "scheduler", None)
+        if scheduler is None or len(self.ids) != len(self.sites):
+            agents = self.agents.sprites()
+            self._entries = {}
+        else:
+            # Resting agents keep their entries; one that did move is caught by the position check in site_id.
+            agents = [agent for agent in scheduler.active if agent in self.agents]
+        rows = self.classify(agents).tolist()
+        self._entries.update({agent: ((agent.pos.x, agent.pos.y), row) for agent, row in zip(agents, rows)})
+        self._tick = self.shared.counter
+        self.batches += 1
+        self.classified += len(agents)
+
+    def site_id(self, agent) -> int | None:
+        """The id of the site `agent` is on, or None; the same answer as `agent.on_site_id()`."""
+        if self._tick != self.shared.counter:
+            self.refresh()
+
+        pos = (agent.pos.x, agent.pos.y)
+        entry = self._entries.get(agent)
+        if entry is None or entry[0] != pos:
+            self.singles += 1
+            entry = self._entries[agent] = (pos, int(self.classify([agent])[0]))
+
+        row = entry[1]
+        return None if row < 0 else int(self.ids[row])
+
+    def report(self) -> str:
+        return (f"site index: {self.batches} batched classifications of {self.classified} agents, "
+                f"{self.singles} agents re-classified after moving, {self.mask_tests} exact mask tests")
+
+
+def use_site_index(simulation) -> SiteIndex:
+    """Attach a `SiteIndex` over the simulation's sites and agents as `simulation.shared.site_index`."""
+    index = SiteIndex(simulation._sites, simulation._agents, simulation.shared)
+    simulation.shared.site_index = index
+    return index
@@ -0,0 +1,52 @@
+"""Site occupancy recorded once per sampling tick, for the whole population.
+
+`AggregationAgent.update_datapoints` used to have every agent count itself into
+a nested dict with string keys (`datapoints[tick][f'site_{id}'] += 1`) every 100
+ticks. A `SiteRecorder` is called by the simulation once per tick instead. On a
+sampling tick it classifies all agents against every site in one batched
+`SiteIndex.classify` call and writes one row of counts into a preallocated
+`(samples, sites)` int32 array.
+"""
+from __future__ import annotations
+
+import numpy as np
+
+
+class SiteRecorder:
+    def __init__(self, every: int = 100, duration: int = 0):
+        self.every = every
+        # One row per sampling tick, tick 0 included; grows if the run lasts longer.
+        capacity = duration // every + 1 if duration > 0 else 64
+        self.ticks = np.zeros(capacity, dtype=np.int64)
+        self.counts = np.zeros((capacity, 0), dtype=np.int32)
+        self.site_ids = np.empty(0, dtype=np.int64)
+        self.samples = 0
+
+    def due(self, tick: int) -> bool:
+        return tick % self.every == 0
+
+    def record(self, tick: int, site_index) -> None:
+        """Append the occupancy of every site at `tick`, as classified by a `SiteIndex`."""
+        on_site = site_index.classify()
+        sites = len(site_index.ids)
+        if sites != self.counts.shape[1]:
+            counts = np.zeros((len(self.ticks), sites), dtype=np.int32)
+            kept = min(sites, self.counts.shape[1])
+            counts[:, :kept] = self.counts[:, :kept]
+            self.counts = counts
+            self.site_ids = site_index.ids.copy()
+        if self.samples == len(self.ticks):
+            self.ticks = np.concatenate((self.ticks, np.zeros_like(self.ticks)))
+            self.counts = np.concatenate((self.counts, np.zeros_like(self.counts)))
+
+        self.ticks[self.samples] = tick
+        self.counts[self.samples] = np.bincount(on_site[on_site >= 0], minlength=sites)
+        self.samples += 1
+
+    def to_datapoints(self) -> dict[int, dict[str, int]]:
+        """The samples as `{tick: {'site_<id>': count, ...}}`, the layout of the datapoints JSON files."""
+        names = [f"site_{site_id}" for site_id in self.site_ids.tolist()]
+        return {
+            tick: dict(zip(names, row))
+            for tick, row in zip(self.ticks[:self.samples].tolist(), self.counts[:self.samples].tolist())
+        }
@@ -0,0 +1,125 @@
+"""Site occupancy of a whole ensemble in one columnar file.
+
+The aggregation runs used to write every replica's samples as nested JSON
+(`{sim: {tick: {'site_0': n, 'site_1': m}}}`, indented), and `plot.py` and
+`pscore.py` parsed the whole file again for every statistic, walking string
+keys. `write_site_counts` stores the samples as one Arrow IPC file in long
+form instead: one row per (sim, tick, site), with `count` next to it. The
+file is uncompressed, so `load_site_counts` memory-maps it and hands out the
+columns as NumPy arrays without parsing or copying them:
+
+    write_site_counts("datapoints_30.arrow", {replica: recorder, ...})
+
+    counts = load_site_counts("datapoints_30.arrow")
+    counts.array()  # (sims, samples, sites) int32
+
+Runs stopped early (see `stop_conditions`) have fewer samples than the rest;
+`array` fills their missing samples with -1. Old JSON files still load, through
+`read_datapoints_json`.
+"""
+from __future__ import annotations
+
+from functools import cached_property
+import json
+from pathlib import Path
+
+import numpy as np
+import polars as pl
+
+SCHEMA = {"sim": pl.Int32, "tick": pl.Int64, "site": pl.Int32, "count": pl.Int32}
+
+
+class SiteCounts:
+    """The columns of a site store, plus the (sims, samples, sites) grid they fill."""
+
+    def __init__(self, sim: np.ndarray, tick: np.ndarray, site: np.ndarray, count: np.ndarray):
+        self.sim = sim
+        self.tick = tick
+        self.site = site
+        self.count = count
+
+    @cached_property
+    def sims(self) -> np.ndarray:
+        return np.unique(self.sim)
+
+    @cached_property
+    def ticks(self) -> np.ndarray:
+        """Every tick sampled by at least one run, ascending."""
+        return np.unique(self.tick)
+
+    @cached_property
+    def site_ids(self) -> np.ndarray:
+        return np.unique(self.site)
+
+    def __len__(self) -> int:
+        return len(self.sims)
+
+    def chunks(self, sims: int):
+        """Yield the store `sims` runs at a time, each chunk a `SiteCounts` of its own.
+
+        The rows of a store are grouped by run, so a chunk is a slice of the
+        (memory-mapped) columns, and only one chunk's `array` is in memory at a time.
+        """
+        order = None
+        if len(self.sim) and (np.diff(self.sim) < 0).any():
+            order = np.argsort(self.sim, kind="stable")
+        sim = self.sim if order is None else self.sim[order]
+        bounds = np.searchsorted(sim, self.sims[::sims])
+        for start, end in zip(bounds.tolist(), [*bounds[1:].tolist(), len(sim)]):
+            rows = slice(start, end) if order is None else order[start:end]
+            yield SiteCounts(self.sim[rows], self.tick[rows], self.site[rows], self.count[rows])
+
+    def array(self, fill: int = -1) -> np.ndarray:
+        """Counts as a `(sims, samples, sites)` int32 array, indexed like `sims`, `ticks` and `site_ids`."""
+        grid = np.full((len(self.sims), len(self.ticks), len(self.site_ids)), fill, dtype=np.int32)
+        grid[np.searchsorted(self.sims, self.sim), np.searchsorted(self.ticks, self.tick),
+             np.searchsorted(self.site_ids, self.site)] = self.count
+        return grid
+
+    def on_site(self, site_id: int, fill: int = -1) -> np.ndarray:
+        """Counts on one site as a `(sims, samples)` array."""
+        return self.array(fill)[:, :, int(np.searchsorted(self.site_ids, site_id))]
+
+    def frame(self) -> pl.DataFrame:
+        return pl.DataFrame({"sim": self.sim, "tick": self.tick, "site": self.site, "count": self.count},
+                            schema=SCHEMA)
+
+
+def from_recorders(recorders: dict[int, object]) -> SiteCounts:
+    """Long-form columns from `{sim: SiteRecorder}`."""
+    columns = {name: [] for name in SCHEMA}
+    for sim, recorder in recorders.items():
+        samples, sites = recorder.samples, len(recorder.site_ids)
+        columns["sim"].append(np.full(samples * sites, sim, dtype=np.int32))
+        columns["tick"].append(np.repeat(recorder.ticks[:samples], sites))
+        columns["site"].append(np.tile(recorder.site_ids, samples).astype(np.int32))
+        columns["count"].append(recorder.counts[:samples].ravel())
+    return SiteCounts(*(np.concatenate(columns[name]) for name in SCHEMA))
+
+
+def write_site_counts(path: str | Path, recorders: dict[int, object]) -> Path:
+    """Write `{sim: SiteRecorder}` to one uncompressed Arrow IPC file at `path`."""
+    path = Path(path)
+    from_recorders(recorders).frame().write_ipc(path, compression="uncompressed")
+    return path
+
+
+def read_datapoints_json(path: str | Path) -> SiteCounts:
+    """Load a `{sim: {tick: {'site_<id>': count}}}` JSON file written before the site store."""
+    with open(path, "r") as f:
+        data = json.load(f)
+
+    rows = np.array([(int(sim), int(tick), int(name.removeprefix("site_")), count)
+                     for sim, ticks in data.items() for tick, sites in ticks.items() for name, count in sites.items()],
+                    dtype=np.int64).reshape(-1, 4)
+    return SiteCounts(rows[:, 0].astype(np.int32), rows[:, 1], rows[:, 2].astype(np.int32), rows[:, 3].astype(np.int32))
+
+
+def load_site_counts(path: str | Path) -> SiteCounts:
+    """Memory-map a site store (or read an old datapoints JSON file) and return its columns."""
+    path = Path(path)
+    if path.suffix == ".json":
+        return read_datapoints_json(path)
+
+    frame = pl.read_ipc(path, memory_map=True, rechunk=False)
+    return SiteCounts(*(frame[name].to_numpy() for name in SCHEMA))
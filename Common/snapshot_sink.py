@@ -0,0 +1,63 @@
+"""Per-agent snapshots streamed to disk while the simulation runs.
+
+Violet gathers every agent's replay row (frame, id, x, y, image_index) and its
+`save_data` columns during a tick, then stacks them onto one in-memory Polars
+DataFrame, `simulation.run().snapshots`. Over 20000 frames with a few thousand
+agents, that table holds tens of millions of rows until the run ends.
+
+A `SnapshotSink` takes over that per-tick merge. It hands each tick's rows to a
+`ColumnarWriter` instead, which writes them out as Parquet parts of
+`chunk_rows` rows. Memory stays at one chunk however long the run.
+`scan_snapshots` reads the parts back lazily, so the usual frame aggregations
+run out-of-core with Polars' streaming engine:
+
+    sink = use_snapshot_sink(simulation, "snapshots/run-1")
+    simulation.run()
+    sink.close()
+
+    (scan_snapshots("snapshots/run-1")
+        .group_by("frame", "kind").agg(pl.col("age").mean())
+        .collect(engine="streaming"))
+
+Add it before `use_population_counter(..., keep_snapshots=True)` to have both.
+"""
+from __future__ import annotations
+
+from collections import defaultdict
+from pathlib import Path
+
+import polars as pl
+from vi.metrics import Metrics
+
+from columnar import ColumnarWriter, scan
+
+
+class SnapshotSink(Metrics):
+    """Violet's metrics, with the snapshot rows written to a `ColumnarWriter` at every merge instead of kept."""
+
+    def __init__(self, path: str | Path, chunk_rows: int = 200_000):
+        super().__init__()
+        self.writer = ColumnarWriter(path, chunk_rows=chunk_rows)
+
+    def _merge(self) -> None:
+        columns = self._temporary_snapshots
+        if columns:
+            self.writer.extend(columns)
+        self._temporary_snapshots = defaultdict(list)
+
+    def close(self) -> None:
+        """Write the rows still buffered; call once the run has ended."""
+        self.writer.close()
+
+
+def use_snapshot_sink(simulation, path: str | Path, chunk_rows: int = 200_000) -> SnapshotSink:
+    """Stream the simulation's snapshots to Parquet parts under `path`; `run().snapshots` stays empty."""
+    sink = SnapshotSink(path, chunk_rows)
+    sink.fps = simulation._metrics.fps
+    simulation._metrics = sink
+    return sink
+
+
+def scan_snapshots(path: str | Path) -> pl.LazyFrame:
+    """Lazily read the snapshots a `SnapshotSink` wrote to `path`."""
+    return scan(path)
@@ -0,0 +1,224 @@
+"""Uniform-grid spatial hash for neighbour queries.
+
+Violet's `ProximityEngine` rebuilds a dict of sets from scratch every tick and uses
+chunks of `2 * radius`, so `in_proximity_performance` returns everything in a
+`2r x 2r` square whether it is in range or not, and `in_proximity_accuracy` pays
+for a Python-level distance check per candidate.
+
+`SpatialHash` buckets points into cells of exactly `radius` wide instead, so
+everything within `radius` of a point lies in the 3x3 cells around it. The points
+are kept as a permutation sorted by cell id; since cells `(x, y - 1)`, `(x, y)`
+and `(x, y + 1)` have consecutive ids, each column of a 3x3 block is one
+contiguous run of that permutation. Every tick the permutation is re-sorted
+starting from the previous tick's order, which is nearly sorted already
+because only the points that crossed a cell border are out of place.
+
+`SpatialHashProximity` wraps it in the interface the simulation expects from its
+proximity engine, so a model switches over with `use_spatial_hash(simulation)`.
+It finds all in-range pairs for the whole population in one batched pass when
+the proximity engine is updated, so each agent's query is a list slice.
+"""
+from __future__ import annotations
+
+import numpy as np
+
+
+# Upper bound on the number of candidate pairs materialised at once.
+# Keeps memory flat no matter how dense the population gets.
+MAX_PAIRS_PER_BLOCK = 4_000_000
+
+# Cell id offsets between the three columns of a 3x3 block, in units of `cells_y`.
+COLUMNS = np.array([-1, 0, 1])
+
+
+class SpatialHash:
+    def __init__(self, cell_size: float):
+        self.cell_size = cell_size
+        self.pos = np.empty((0, 2))
+        self.cell_id = np.empty(0, dtype=np.int64)
+        self.order = np.empty(0, dtype=np.int64)
+        self.sorted_id = np.empty(0, dtype=np.int64)
+        self.cells_y = 1
+        self.moved = 0
+        """How many points changed cell during the last `rebuild`."""
+
+    def __len__(self) -> int:
+        return len(self.pos)
+
+    def _cells(self, pos: np.ndarray) -> np.ndarray:
+        return np.floor(pos / self.cell_size).astype(np.int64)
+
+    def rebuild(self, pos: np.ndarray) -> SpatialHash:
+        """Re-bucket the points at `pos`, an `(n, 2)` array.
+
+        If the number of points didn't change, point `i` is assumed to be the same
+        point as last time and the previous order is used as the starting point.
+        """
+        pos = np.asarray(pos, dtype=np.float64).reshape(-1, 2)
+        cell = self._cells(pos)
+        if len(cell):
+            # Shift so the lowest cell is (1, 1) and leave an empty row above and below,
+            # so a block's column never runs into the next column.
+            self.origin = cell.min(axis=0) - 1
+            cell -= self.origin
+            self.cells_y = int(cell[:, 1].max()) + 2
+        cell_id = cell[:, 0] * self.cells_y + cell[:, 1]
+
+        if len(cell_id) == len(self.cell_id) and len(cell_id):
+            self.moved = int(np.count_nonzero(cell_id != self.cell_id))
+            previous = self.order
+            order = previous[np.argsort(cell_id[previous], kind="stable")]
+        else:
+            self.moved = len(cell_id)
+            order = np.argsort(cell_id, kind="stable")
+
+        self.pos = pos
+        self.cell_id = cell_id
+        self.order = order
+        self.sorted_id = cell_id[order]
+        return self
+
+    def _runs(self, cell_id: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        # Start and length, within `order`, of the three columns of the 3x3 block around each cell.
+        columns = cell_id[:, None] + COLUMNS[None, :] * self.cells_y
+        starts = np.searchsorted(self.sorted_id, columns - 1, side="left")
+        ends = np.searchsorted(self.sorted_id, columns + 1, side="right")
+        return starts, ends - starts
+
+    def pairs(self, radius: float | None = None):
+        """Yield blocks of `(i, j, diff, dist)` for every ordered pair of points within `radius`.
+
+        `diff` is `pos[i] - pos[j]`. Pairs come out sorted by `i`.
+        `radius` defaults to the cell size and must not be larger than it.
+        """
+        n = len(self.pos)
+        if n == 0:
+            return
+        radius = self.cell_size if radius is None else radius
+        radius_sq = radius * radius
+        x = np.ascontiguousarray(self.pos[:, 0])
+        y = np.ascontiguousarray(self.pos[:, 1])
+
+        starts, counts = self._runs(self.cell_id)
+        per_point = counts.sum(axis=1)
+        block_start = 0
+        while block_start < n:
+            # Grow the block until it would materialise too many candidate pairs.
+            cumulative = np.cumsum(per_point[block_start:])
+            block_len = int(np.searchsorted(cumulative, MAX_PAIRS_PER_BLOCK, side="right"))
+            block_end = block_start + max(block_len, 1)
+
+            block_counts = counts[block_start:block_end].ravel()
+            total = int(block_counts.sum())
+            if total:
+                i = np.repeat(np.arange(block_start, block_end), per_point[block_start:block_end])
+                run_offset = np.repeat(np.cumsum(block_counts) - block_counts, block_counts)
+                run_start = np.repeat(starts[block_start:block_end].ravel(), block_counts)
+                j = self.order[run_start + np.arange(total) - run_offset]
+
+                dx = x[i] - x[j]
+                dy = y[i] - y[j]
+                dist_sq = dx * dx + dy * dy
+                keep = (dist_sq <= radius_sq) & (i != j)
+                i, j = i[keep], j[keep]
+                diff = np.column_stack((dx[keep], dy[keep]))
+                yield i, j, diff, np.sqrt(dist_sq[keep])
+
+            block_start = block_end
+
+    def query(self, x: float, y: float, radius: float | None = None) -> tuple[np.ndarray, np.ndarray]:
+        """Return `(indices, distances)` of the points within `radius` of `(x, y)`.
+
+        Only the 3x3 cells around `(x, y)` are searched.
+        """
+        radius = self.cell_size if radius is None else radius
+        if len(self.pos) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+
+        cx, cy = self._cells(np.array([x, y])) - self.origin
+        if not 0 <= cy < self.cells_y:
+            # At least one empty row away from every point: nothing can be in range.
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        cell_id = np.array([cx * self.cells_y + cy])
+        starts, counts = self._runs(cell_id)
+
+        candidates = np.concatenate([self.order[s:s + c] for s, c in zip(starts[0], counts[0])])
+        diff = self.pos[candidates] - (x, y)
+        dist = np.hypot(diff[:, 0], diff[:, 1])
+        keep = dist <= radius
+        return candidates[keep], dist[keep]
+
+
+class SpatialHashProximity:
+    """Drop-in replacement for Violet's `ProximityEngine` backed by a `SpatialHash`."""
+
+    def __init__(self, agents, radius: float):
+        self._agents = agents
+        self.hash = SpatialHash(radius)
+        self._set_radius(radius)
+
+        self._row = {}
+        self._members = []
+        self._neighbours = []
+        self._distances = []
+        self._bounds = [0]
+
+    def _set_radius(self, radius: float):
+        self.radius = radius
+        self.hash.cell_size = radius
+        # Only used to draw the grid when `visualise_chunks` is on.
+        self.chunk_size = max(int(radius), 1)
+
+    def update(self):
+        members = self._agents.sprites()
+        pos = np.array([(agent.pos.x, agent.pos.y) for agent in members], dtype=np.float64)
+        self.hash.rebuild(pos)
+
+        n = len(members)
+        lookup = np.empty(n, dtype=object)
+        lookup[:] = members
+
+        neighbours = []
+        distances = []
+        counts = np.zeros(n, dtype=np.int64)
+        for i, j, _, dist in self.hash.pairs(self.radius):
+            neighbours.extend(lookup[j].tolist())
+            distances.extend(dist.tolist())
+            counts += np.bincount(i, minlength=n)
+
+        self._row = {agent: row for row, agent in enumerate(members)}
+        self._members = members
+        self._neighbours = neighbours
+        self._distances = distances
+        self._bounds = np.concatenate(([0], np.cumsum(counts))).tolist()
+
+    def _lookup(self, agent):
+        # (neighbours, distances) of an agent as of the last update.
+        row = self._row.get(agent)
+        if row is None:
+            # Spawned since the last update: fall back to a single point query.
+            indices, distances = self.hash.query(agent.pos.x, agent.pos.y, self.radius)
+            others = [self._members[k] for k in indices.tolist()]
+            return others, distances.tolist()
+
+        start, end = self._bounds[row], self._bounds[row + 1]
+        return self._neighbours[start:end], self._distances[start:end]
+
+    def in_proximity_performance(self, agent):
+        # Unlike the chunk engine, the hash only ever returns agents that are actually in range.
+        if not agent.is_alive():
+            return iter(())
+        others, _ = self._lookup(agent)
+        return iter(others)
+
+    def in_proximity_accuracy(self, agent):
+        if not agent.is_alive():
+            return iter(())
+        others, distances = self._lookup(agent)
+        return zip(others, distances)
+
+
+def use_spatial_hash(simulation):
+    """Swap the simulation's proximity engine for a `SpatialHashProximity`."""
+    simulation._proximity = SpatialHashProximity(simulation._agents, simulation.config.radius)
+    return simulation
@@ -0,0 +1,116 @@
+"""Structure-of-arrays storage for agents kept as rows of typed arrays.
+
+Every agent keeps its state (`energy`, `age`, `ticks`, ...) as attributes of
+its own Python object, next to Violet's sprite, vectors, rect and mask: some
+700 bytes per agent, and no way to look at one field of all agents at once. A
+`StateStore` keeps each field in one typed NumPy column (float32/int32/int8,
+or float64 for positions) indexed by slot, with an `alive` mask, for engines
+that keep their agents in the store alone and apply every rule to a whole
+column at once (`PredatorPreyEngine` in `population_engine.py`).
+
+Agent objects don't read their fields from a store. A descriptor that reads
+one slot at a time creates a new Python number on every read, and on CPython
+3.13 instance attributes are already stored inline, so the agents would only
+grow (see `bench_state_store.py`).
+
+Slots of killed agents are reused, but not before the next tick: an agent
+killed during its own update usually keeps reading its fields until the end of
+that update. When the store is full, its capacity doubles. `allocate_many` and
+`release_many` do the same for a whole batch of slots at once.
+`StateStore.column` gives the live NumPy view of any field.
+"""
+from __future__ import annotations
+
+import numpy as np
+
+
+class StateStore:
+    def __init__(self, fields: dict[str, str], shared=None, capacity: int = 1024):
+        self.shared = shared
+        self.capacity = capacity
+        self.columns = {name: np.zeros(capacity, dtype=dtype) for name, dtype in fields.items()}
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.size = 0
+        """Slots in use so far (alive or not); every live slot is below this."""
+
+        self._free = []
+        self._retired = []
+        self._retired_tick = None
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self.alive[:self.size]))
+
+    def _tick(self):
+        return None if self.shared is None else self.shared.counter
+
+    def allocate(self) -> int:
+        if self._retired and self._retired_tick != self._tick():
+            self._free.extend(self._retired)
+            self._retired = []
+
+        if self._free:
+            slot = self._free.pop()
+        else:
+            if self.size == self.capacity:
+                self._grow()
+            slot = self.size
+            self.size += 1
+
+        for column in self.columns.values():
+            column[slot] = 0
+        self.alive[slot] = True
+        return slot
+
+    def allocate_many(self, count: int) -> np.ndarray:
+        """`count` slots at once, as `allocate` hands them out one by one: reused slots first, then new ones."""
+        if self._retired and self._retired_tick != self._tick():
+            self._free.extend(self._retired)
+            self._retired = []
+
+        reused = min(count, len(self._free))
+        slots = self._free[len(self._free) - reused:][::-1]
+        del self._free[len(self._free) - reused:]
+        fresh = count - reused
+        while self.size + fresh > self.capacity:
+            self._grow()
+        slots = np.concatenate((np.array(slots, dtype=np.int64), np.arange(self.size, self.size + fresh)))
+        self.size += fresh
+
+        for column in self.columns.values():
+            column[slots] = 0
+        self.alive[slots] = True
+        return slots
+
+    def release(self, slot: int) -> None:
+        # The slot is handed out again from the next tick on.
+        if not self.alive[slot]:
+            return
+        self.alive[slot] = False
+        self._retired.append(slot)
+        self._retired_tick = self._tick()
+
+    def release_many(self, slots: np.ndarray) -> None:
+        slots = np.unique(slots)
+        slots = slots[self.alive[slots]]
+        if not len(slots):
+            return
+        self.alive[slots] = False
+        self._retired.extend(slots.tolist())
+        self._retired_tick = self._tick()
+
+    def _grow(self) -> None:
+        self.capacity *= 2
+        for name, column in self.columns.items():
+            grown = np.zeros(self.capacity, dtype=column.dtype)
+            grown[:len(column)] = column
+            self.columns[name] = grown
+        alive = np.zeros(self.capacity, dtype=bool)
+        alive[:self.size] = self.alive[:self.size]
+        self.alive = alive
+
+    def column(self, name: str) -> np.ndarray:
+        """The first `size` entries of a field; dead slots are included (see `alive`)."""
+        return self.columns[name][:self.size]
+
+    def nbytes(self) -> int:
+        return sum(column.nbytes for column in self.columns.values()) + self.alive.nbytes
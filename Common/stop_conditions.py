@@ -0,0 +1,63 @@
+"""Stop conditions checked while a run records site occupancy.
+
+The aggregation runs used to simulate all `duration` ticks, and
+`pscore.find_full_aggregation_ticks` found afterwards when the swarm had
+converged. A stop condition is checked after every sample instead: it is any
+callable that takes the `SiteRecorder` and returns True once the run may stop.
+It keeps its own record of why.
+
+    convergence = AllOnOneSite(agents=50, samples=5)
+    simulation.stop_conditions.append(convergence)
+    ...
+    convergence.result()  # {"tick": 1800, "site": 0}, or None
+"""
+from __future__ import annotations
+
+from typing import Callable
+
+import numpy as np
+
+
+class AllOnOneSite:
+    """Every one of `agents` agents on the same site for `samples` samples in a row.
+
+    The streak of `find_full_aggregation_ticks`; `tick` is where it started.
+    """
+
+    def __init__(self, agents: int, samples: int = 5):
+        self.agents = agents
+        self.samples = samples
+        self.streak = 0
+        self.streak_site = None
+        self.streak_start = None
+
+        self.tick = None
+        self.site = None
+
+    def __call__(self, recorder) -> bool:
+        last = recorder.samples - 1
+        full = np.flatnonzero(recorder.counts[last] == self.agents)
+        if not len(full):
+            self.streak = 0
+            self.streak_site = None
+            return False
+
+        site = int(recorder.site_ids[full[0]])
+        if site != self.streak_site:
+            self.streak = 0
+            self.streak_site = site
+            self.streak_start = int(recorder.ticks[last])
+        self.streak += 1
+
+        if self.streak >= self.samples and self.tick is None:
+            self.tick = self.streak_start
+            self.site = site
+        return self.tick is not None
+
+    def result(self) -> dict[str, int] | None:
+        return None if self.tick is None else {"tick": self.tick, "site": self.site}
+
+
+def should_stop(conditions: list[Callable], recorder) -> bool:
+    # Every condition sees every sample, even when an earlier one already says stop.
+    return any([condition(recorder) for condition in conditions])
@@ -0,0 +1,90 @@
+"""Whole-swarm order parameters, computed as array reductions.
+
+Instead of every agent saving its own row with `save_data` every tick, these
+functions take the positions and velocities of all agents as `(n, 2)` arrays and
+reduce them to one number each:
+
+- `polarization`: length of the mean unit velocity. 1 when every agent heads
+  the same way, close to 0 for random headings;
+- `mean_nearest_distance`: mean distance from each agent to its nearest neighbour;
+- `cluster_count`: connected components of the graph linking agents closer than
+  `radius` to each other;
+- `min_distance`: smallest distance between any agent of one group (predators)
+  and any agent of another (prey).
+
+Distances are plain Euclidean, without wrapping around the window edges, like
+the proximity engines. `SwarmRecorder` computes all of them every `every` ticks
+and streams one row per sample to a `ColumnarWriter`.
+"""
+from __future__ import annotations
+
+from pathlib import Path
+
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from scipy.spatial import cKDTree
+
+from columnar import ColumnarWriter
+
+
+def polarization(move: np.ndarray) -> float:
+    if len(move) == 0:
+        return float("nan")
+    speed = np.hypot(move[:, 0], move[:, 1])
+    moving = speed > 0
+    if not moving.any():
+        return 0.0
+    heading = move[moving] / speed[moving, None]
+    return float(np.hypot(*heading.sum(axis=0)) / len(move))
+
+
+def mean_nearest_distance(pos: np.ndarray) -> float:
+    if len(pos) < 2:
+        return float("nan")
+    distances, _ = cKDTree(pos).query(pos, k=2)
+    return float(distances[:, 1].mean())
+
+
+def cluster_count(pos: np.ndarray, radius: float) -> int:
+    n = len(pos)
+    if n == 0:
+        return 0
+    pairs = cKDTree(pos).query_pairs(radius, output_type="ndarray")
+    graph = coo_matrix((np.ones(len(pairs)), (pairs[:, 0], pairs[:, 1])), shape=(n, n))
+    count, _ = connected_components(graph, directed=False)
+    return int(count)
+
+
+def min_distance(pos: np.ndarray, others: np.ndarray) -> float:
+    if len(pos) == 0 or len(others) == 0:
+        return float("nan")
+    distances, _ = cKDTree(others).query(pos, k=1)
+    return float(distances.min())
+
+
+class SwarmRecorder:
+    """Writes the swarm metrics of every `every`-th tick to a `ColumnarWriter` at `path`."""
+
+    def __init__(self, path: str | Path, every: int = 10, cluster_radius: float = 50.0, chunk_rows: int = 1_000):
+        self.every = every
+        self.cluster_radius = cluster_radius
+        self.writer = ColumnarWriter(path, chunk_rows=chunk_rows)
+
+    def due(self, tick: int) -> bool:
+        return tick % self.every == 0
+
+    def record(self, tick: int, pos: np.ndarray, move: np.ndarray,
+               predator_pos: np.ndarray | None = None) -> None:
+        self.writer.append(
+            tick=tick,
+            agents=len(pos),
+            polarization=polarization(move),
+            mean_nearest_distance=mean_nearest_distance(pos),
+            clusters=cluster_count(pos, self.cluster_radius),
+            predators=0 if predator_pos is None else len(predator_pos),
+            predator_prey_min_distance=float("nan") if predator_pos is None else min_distance(predator_pos, pos),
+        )
+
+    def close(self) -> None:
+        self.writer.close()
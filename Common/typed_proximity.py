@@ -0,0 +1,113 @@
+"""Proximity chunks kept per agent type, for queries that want one type only.
+
+`Predator.detect_prey` walks everything `in_proximity_performance` returns and
+skips whatever isn't `Prey` with an `isinstance` check, through the chunk
+engine's generator. `TypedProximityEngine` buckets the agents per type as well
+as per chunk. `in_proximity_of(Prey)` then hands back the prey in the agent's
+chunk directly: no generator over other types, no type checks.
+
+It is Violet's `ProximityEngine` otherwise: chunks of `2 * radius`, and a
+performance query returns the agents in the same chunk, in range or not. It
+replaces that engine with `use_typed_proximity(simulation)`, after which agents
+with the `TypedQueries` mixin ask it directly:
+
+    class Predator(TypedQueries, Agent[PredatorPreyConfig]):
+        def detect_prey(self):
+            for prey in self.in_proximity_of(Prey):
+                ...
+
+Subclasses count as their base type, as with `isinstance`. Within a chunk,
+agents come in the order they were added to the simulation.
+"""
+from __future__ import annotations
+
+from collections import defaultdict
+
+
+class TypedProximityEngine:
+    def __init__(self, agents, radius: int):
+        self._agents = agents
+        self._chunks = {}
+        """Agent type -> {chunk: [agents of exactly that type]}."""
+        self._matching = {}
+        """Queried type -> the agent types that are instances of it."""
+        self._set_radius(radius)
+
+    def _set_radius(self, radius: int) -> None:
+        self.radius = radius
+        self.chunk_size = radius * 2
+
+    def _chunk(self, agent) -> tuple[int, int]:
+        x, y = agent.center
+        return x // self.chunk_size, y // self.chunk_size
+
+    def update(self) -> None:
+        chunks = {}
+        for agent in self._agents.sprites():
+            by_chunk = chunks.get(type(agent))
+            if by_chunk is None:
+                by_chunk = chunks[type(agent)] = defaultdict(list)
+            by_chunk[self._chunk(agent)].append(agent)
+
+        if chunks.keys() != self._chunks.keys():
+            self._matching = {}
+        self._chunks = chunks
+
+    def _types(self, kind) -> list[type]:
+        types = self._matching.get(kind)
+        if types is None:
+            types = self._matching[kind] = [agent_type for agent_type in self._chunks if issubclass(agent_type, kind)]
+        return types
+
+    def in_proximity_of(self, agent, kind):
+        """The agents of type `kind` in the same chunk as `agent`, as `in_proximity_performance` would find them."""
+        if not agent.is_alive():
+            return iter(())
+
+        chunk = self._chunk(agent)
+        buckets = [bucket for agent_type in self._types(kind)
+                   if (bucket := self._chunks[agent_type].get(chunk))]
+        if len(buckets) == 1 and not isinstance(agent, kind):
+            return iter(buckets[0])
+        return (other for bucket in buckets for other in bucket if other is not agent)
+
+    def in_proximity_performance(self, agent):
+        return self.in_proximity_of(agent, object)
+
+    def in_proximity_accuracy(self, agent):
+        # Violet's accuracy query: the agent's chunk and the three chunks nearest to it, then a distance check.
+        if not agent.is_alive():
+            return
+        x, y = agent.center
+        x_chunk, x_offset = divmod(x, self.chunk_size)
+        y_chunk, y_offset = divmod(y, self.chunk_size)
+        x_step = 1 if x_offset >= self.radius else -1
+        x_last = x_chunk + (0 if x_offset == self.radius else x_step)
+        y_step = 1 if y_offset >= self.radius else -1
+        y_last = y_chunk + (0 if y_offset == self.radius else y_step)
+
+        for chunk_x in range(x_chunk, x_last + x_step, x_step):
+            for chunk_y in range(y_chunk, y_last + y_step, y_step):
+                for by_chunk in self._chunks.values():
+                    for other in by_chunk.get((chunk_x, chunk_y), ()):
+                        distance = agent.pos.distance_to(other.pos)
+                        if other is not agent and distance <= self.radius:
+                            yield other, distance
+
+
+class TypedQueries:
+    """Agent mixin adding `in_proximity_of(kind)`, served by a `TypedProximityEngine` when the simulation has one."""
+
+    def in_proximity_of(self, kind):
+        engine = getattr(self.shared, "typed_proximity", None)
+        if engine is None:
+            return (other for other in self.in_proximity_performance() if isinstance(other, kind))
+        return engine.in_proximity_of(self, kind)
+
+
+def use_typed_proximity(simulation) -> TypedProximityEngine:
+    """Swap the simulation's proximity engine for a `TypedProximityEngine`, also `simulation.shared.typed_proximity`."""
+    engine = TypedProximityEngine(simulation._agents, simulation.config.radius)
+    simulation._proximity = engine
+    simulation.shared.typed_proximity = engine
+    return engine
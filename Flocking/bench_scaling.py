@@ -0,0 +1,240 @@
+"""Scaling benchmark for the flocking models.
+
+Runs `flocking.py` and `flocking_pred.py` headless over a grid of agent counts,
+radii and predator ratios and writes one JSON results file:
+
+    uv run bench_scaling.py run --out results.json
+    uv run bench_scaling.py run --models flocking-numpy --counts 1000 10000 100000 --out numpy.json
+
+Models:
+
+- `flocking`: FlockingAgents in a `HeadlessSimulation` (`engine="agents"`);
+- `flocking-numpy`: the `BoidsEngine` arrays on their own, no agents;
+- `flocking_pred`: FlockingAgents and PredatorAgents, `--predator-ratios` of the
+  agents being predators (at least one when the ratio is above zero).
+
+Every case runs in a fresh process, so its peak RSS is its own. Every tick is
+timed on its own after `--warmup` untimed ticks. A case records the per-tick
+latency percentiles, agent updates per second (agents x ticks / time) and the
+peak RSS of its process.
+
+As in `bench_spatial_hash.py`, the window grows with the agent count so the
+density stays at that of `run_sim` (50 agents in 750x750); pass `--fixed-window`
+to keep 750x750.
+
+Compare two results files to flag regressions. It exits with status 1 when any
+case's median or p95 tick latency, or its peak RSS, grew by more than
+`--threshold` (default 10%):
+
+    uv run bench_scaling.py compare baseline.json results.json
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing
+import os
+from pathlib import Path
+import platform
+import resource
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+IMAGES = Path(__file__).resolve().parent.parent / "images"
+MODELS = ["flocking", "flocking-numpy", "flocking_pred"]
+PERCENTILES = [50, 90, 95, 99]
+
+
+def _config(module, count: int, radius: float, fixed_window: bool, seed: int):
+    # The run_sim settings, with the window scaled to the agent count.
+    side = 750 if fixed_window else round(750 * (count / 50) ** 0.5)
+    config = module.FlockingConfig(
+        movement_speed=500,
+        radius=radius,
+        alignment_weight=0.01,
+        cohesion_weight=0.01,
+        separation_weight=0.1,
+        delta_time=1,
+        max_velocity=7.0,
+        seed=seed,
+    )
+    config.window.width = config.window.height = side
+    if hasattr(config, "width"):
+        # flocking_pred spawns its predators in (width, height).
+        config.width = config.height = side
+    return config, side
+
+
+def _run_case(case: dict) -> dict:
+    # Runs in its own process.
+    sys.path.insert(0, str(Path(__file__).resolve().parent))
+    model, count, radius = case["model"], case["agents"], case["radius"]
+    ticks, warmup, seed = case["ticks"], case["warmup"], case["seed"]
+
+    start = time.perf_counter()
+    if model == "flocking-numpy":
+        import flocking
+        from boids import BoidsEngine
+
+        config, side = _config(flocking, count, radius, case["fixed_window"], seed)
+        engine = BoidsEngine.spawn(config, count, seed=seed)
+        step = engine.step
+    else:
+        module = __import__(model)
+        config, side = _config(module, count, radius, case["fixed_window"], seed)
+        simulation = module.new_simulation(config, headless=True)
+        simulation.batch_spawn_agents(count - case["predators"], module.FlockingAgent,
+                                      images=[str(IMAGES / "triangle.png")])
+        if case["predators"]:
+            simulation.batch_spawn_agents(case["predators"], module.PredatorAgent,
+                                          images=[str(IMAGES / "triangle@50px.png")])
+        step = simulation.tick
+    setup = time.perf_counter() - start
+
+    for _ in range(warmup):
+        step()
+
+    timings = np.empty(ticks)
+    for tick in range(ticks):
+        start = time.perf_counter()
+        step()
+        timings[tick] = time.perf_counter() - start
+
+    return {
+        **{key: case[key] for key in ("model", "agents", "predators", "radius", "ticks")},
+        "window": side,
+        "setup_s": setup,
+        "latency_ms": {
+            **{f"p{q}": float(np.percentile(timings, q)) * 1e3 for q in PERCENTILES},
+            "mean": float(timings.mean()) * 1e3,
+            "max": float(timings.max()) * 1e3,
+        },
+        "agent_updates_per_s": count * ticks / float(timings.sum()),
+        # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+                       / (2 ** 20 if sys.platform == "darwin" else 2 ** 10),
+    }
+
+
+def _cases(args) -> list[dict]:
+    cases = []
+    for model in args.models:
+        ratios = args.predator_ratios if model == "flocking_pred" else [0.0]
+        for count in args.counts:
+            for radius in args.radii:
+                for ratio in ratios:
+                    predators = max(1, round(count * ratio)) if ratio > 0 else 0
+                    cases.append({
+                        "model": model,
+                        "agents": count,
+                        "predators": predators,
+                        "radius": radius,
+                        "ticks": args.ticks,
+                        "warmup": args.warmup,
+                        "seed": args.seed,
+                        "fixed_window": args.fixed_window,
+                    })
+    return cases
+
+
+def _metadata() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=Path(__file__).resolve().parent).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def _key(result: dict) -> tuple:
+    return result["model"], result["agents"], result["predators"], result["radius"]
+
+
+def run(args) -> None:
+    results = []
+    context = multiprocessing.get_context("spawn")
+    print(f"{'model':>15} {'agents':>7} {'preds':>6} {'radius':>6} {'p50 ms':>9} {'p95 ms':>9} "
+          f"{'updates/s':>11} {'RSS MB':>7}")
+    for case in _cases(args):
+        with context.Pool(1) as pool:
+            result = pool.apply(_run_case, (case,))
+        results.append(result)
+        latency = result["latency_ms"]
+        print(f"{result['model']:>15} {result['agents']:>7} {result['predators']:>6} {result['radius']:>6g} "
+              f"{latency['p50']:>9.2f} {latency['p95']:>9.2f} {result['agent_updates_per_s']:>11.0f} "
+              f"{result['peak_rss_mb']:>7.0f}")
+
+        # Written after every case, so an interrupted run keeps what it measured.
+        Path(args.out).write_text(json.dumps({"meta": _metadata(), "results": results}, indent=2))
+
+
+def compare(args) -> int:
+    baseline = {_key(result): result for result in json.loads(Path(args.baseline).read_text())["results"]}
+    current = {_key(result): result for result in json.loads(Path(args.current).read_text())["results"]}
+
+    regressions = 0
+    print(f"{'model':>15} {'agents':>7} {'preds':>6} {'radius':>6} {'p50':>8} {'p95':>8} {'updates/s':>10} "
+          f"{'RSS':>8}")
+    for key in sorted(baseline.keys() & current.keys()):
+        old, new = baseline[key], current[key]
+        changes = {
+            "p50": new["latency_ms"]["p50"] / old["latency_ms"]["p50"] - 1,
+            "p95": new["latency_ms"]["p95"] / old["latency_ms"]["p95"] - 1,
+            "updates/s": new["agent_updates_per_s"] / old["agent_updates_per_s"] - 1,
+            "RSS": new["peak_rss_mb"] / old["peak_rss_mb"] - 1,
+        }
+        regressed = [name for name in ("p50", "p95", "RSS") if changes[name] > args.threshold]
+        regressions += bool(regressed)
+
+        model, agents, predators, radius = key
+        print(f"{model:>15} {agents:>7} {predators:>6} {radius:>6g} "
+              + " ".join(f"{change:>+8.1%}" if name != "updates/s" else f"{change:>+10.1%}"
+                         for name, change in changes.items())
+              + (f"  REGRESSION ({', '.join(regressed)})" if regressed else ""))
+
+    for name, keys in (("baseline", baseline.keys() - current.keys()), ("current", current.keys() - baseline.keys())):
+        if keys:
+            print(f"{len(keys)} cases only in the {name} file")
+
+    print(f"{regressions} regressions above {args.threshold:.0%}")
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run the benchmark grid")
+    run_parser.add_argument("--models", nargs="+", choices=MODELS, default=MODELS)
+    run_parser.add_argument("--counts", type=int, nargs="+", default=[50, 500, 5_000, 50_000, 100_000])
+    run_parser.add_argument("--radii", type=float, nargs="+", default=[50, 200])
+    run_parser.add_argument("--predator-ratios", type=float, nargs="+", default=[0.01, 0.04])
+    run_parser.add_argument("--ticks", type=int, default=20)
+    run_parser.add_argument("--warmup", type=int, default=2)
+    run_parser.add_argument("--seed", type=int, default=1)
+    run_parser.add_argument("--fixed-window", action="store_true")
+    run_parser.add_argument("--out", default="bench_scaling.json")
+
+    compare_parser = commands.add_parser("compare", help="flag regressions between two results files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.10)
+
+    args = parser.parse_args()
+    if args.command == "run":
+        run(args)
+    else:
+        sys.exit(compare(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Per-tick cost of neighbour queries: Violet's chunk engine vs. the spatial hash.
+
+One tick = move every agent a little, update the proximity engine, then run one
+query per agent: `in_proximity_performance` (what every FlockingAgent does) or,
+with `--query accuracy`, `in_proximity_accuracy` (what AggregationAgent does).
+
+By default the window grows with the agent count so the density (and so the
+number of agents in range) stays the same as in `run_sim`: 50 agents in 750x750.
+Pass `--fixed-window` to keep the 750x750 window instead; then every query returns
+a growing share of the flock and both engines go quadratic.
+
+    uv run bench_spatial_hash.py --counts 1000 10000 100000
+
+Both engines scale linearly at constant density. With `--query accuracy` the
+hash is several times faster because it checks distances in one NumPy pass
+instead of one Python call per candidate. For example, in us per agent per tick:
+
+    agents   chunks/perf  hash/perf  chunks/acc  hash/acc
+      1000          5.8        7.2        28.7       8.2
+     10000          6.9        8.3        42.5       8.6
+    100000         11.1        8.9        61.9       9.6
+
+The chunk engine's "performance" query is only cheap because it skips the
+distance check: it returns ~14 agents per query where ~11 are actually in range.
+"""
+import argparse
+from pathlib import Path
+import random
+import sys
+import time
+
+from pygame import Vector2
+from vi.proximity import ProximityEngine
+from vi.util import round_pos
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / "Common"))
+from spatial_hash import SpatialHashProximity
+
+
+class _Point:
+    # The parts of an Agent the proximity engines look at.
+    def __init__(self, id, pos):
+        self.id = id
+        self.pos = pos
+
+    @property
+    def center(self):
+        return round_pos(self.pos)
+
+    def is_alive(self):
+        return True
+
+
+class _Flock:
+    def __init__(self, points):
+        self.points = points
+
+    def sprites(self):
+        return self.points
+
+
+def bench(engine_class, query, count, side, radius, ticks, seed=1):
+    rng = random.Random(seed)
+    points = [_Point(i, Vector2(rng.uniform(0, side), rng.uniform(0, side))) for i in range(count)]
+    engine = engine_class(_Flock(points), radius)
+    query = getattr(engine, f"in_proximity_{query}")
+
+    timings = []
+    neighbours = 0
+    for _ in range(ticks):
+        for point in points:
+            point.pos.x = (point.pos.x + rng.uniform(-5, 5)) % side
+            point.pos.y = (point.pos.y + rng.uniform(-5, 5)) % side
+
+        start = time.perf_counter()
+        engine.update()
+        for point in points:
+            for _ in query(point):
+                neighbours += 1
+        timings.append(time.perf_counter() - start)
+
+    return min(timings), neighbours / (count * ticks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--counts", type=int, nargs="+", default=[1_000, 3_000, 10_000, 30_000, 100_000])
+    parser.add_argument("--radius", type=int, default=200)
+    parser.add_argument("--ticks", type=int, default=3)
+    parser.add_argument("--query", choices=["performance", "accuracy"], default="performance")
+    parser.add_argument("--fixed-window", action="store_true")
+    args = parser.parse_args()
+
+    engines = {"chunks": ProximityEngine, "spatial_hash": SpatialHashProximity}
+
+    print(f"{'agents':>8} {'window':>7} {'engine':>13} {'ms/tick':>10} {'us/agent':>9} {'neighbours':>11}")
+    for count in args.counts:
+        side = 750 if args.fixed_window else round(750 * (count / 50) ** 0.5)
+        for name, engine_class in engines.items():
+            seconds, neighbours = bench(engine_class, args.query, count, side, args.radius, args.ticks)
+            print(f"{count:>8} {side:>7} {name:>13} {seconds * 1e3:>10.1f} "
+                  f"{seconds / count * 1e6:>9.2f} {neighbours:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
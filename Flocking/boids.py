@@ -0,0 +1,155 @@
+"""Vectorised boids engine.
+
+`FlockingAgent.change_position` works on one agent at a time and walks over its
+neighbours with pygame `Vector2`s. `BoidsEngine` keeps the position and velocity
+of every boid in two contiguous `(n, 2)` NumPy arrays instead and computes
+alignment, cohesion and separation for the whole flock in one batched pass per tick.
+
+The rules are the same as in `FlockingAgent`, with two differences:
+
+- neighbours are the boids within `radius` (like `in_proximity_accuracy`)
+  instead of the boids that share a proximity chunk;
+- all boids are updated synchronously from the previous tick's state,
+  instead of one after the other.
+"""
+from __future__ import annotations
+
+import math
+from pathlib import Path
+import sys
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / "Common"))
+from spatial_hash import SpatialHash
+import quadtree
+
+
+class BoidsEngine:
+    def __init__(self, config, pos: np.ndarray, move: np.ndarray,
+                 width: float | None = None, height: float | None = None):
+        self.config = config
+        self.pos = np.ascontiguousarray(pos, dtype=np.float64)
+        self.move = np.ascontiguousarray(move, dtype=np.float64)
+
+        window_width, window_height = config.window.as_tuple()
+        self.width = float(width if width is not None else window_width)
+        self.height = float(height if height is not None else window_height)
+
+        # Neighbours are looked up in the 3x3 radius-sized cells around each boid.
+        self.grid = SpatialHash(float(config.radius))
+        self.ticks = 0
+
+    @classmethod
+    def spawn(cls, config, count: int, seed: int | None = None,
+              width: float | None = None, height: float | None = None) -> BoidsEngine:
+        # Random positions and random headings of length `movement_speed`,
+        # the same starting state `batch_spawn_agents` gives FlockingAgents.
+        rng = np.random.default_rng(seed)
+        window_width, window_height = config.window.as_tuple()
+        width = width if width is not None else window_width
+        height = height if height is not None else window_height
+
+        pos = rng.uniform((0, 0), (width, height), size=(count, 2))
+        angle = rng.uniform(0, 2 * math.pi, size=count)
+        move = np.column_stack((np.cos(angle), np.sin(angle))) * config.movement_speed
+        return cls(config, pos, move, width, height)
+
+    @classmethod
+    def from_agents(cls, config, agents) -> BoidsEngine:
+        pos = np.array([(agent.pos.x, agent.pos.y) for agent in agents], dtype=np.float64)
+        move = np.array([(agent.move.x, agent.move.y) for agent in agents], dtype=np.float64)
+        return cls(config, pos.reshape(-1, 2), move.reshape(-1, 2))
+
+    def write_to(self, agents) -> None:
+        # Copy the engine state back onto the agents (e.g. for rendering).
+        for agent, (x, y), (dx, dy) in zip(agents, self.pos.tolist(), self.move.tolist()):
+            agent.pos.update(x, y)
+            agent.move.update(dx, dy)
+
+    def __len__(self) -> int:
+        return len(self.pos)
+
+    def neighbour_pairs(self):
+        """Yield blocks of `(i, j, diff, dist)` for every ordered pair of boids within `radius`.
+
+        `diff` is `pos[i] - pos[j]`. See `SpatialHash.pairs`.
+        """
+        self.grid.cell_size = float(self.config.radius)
+        yield from self.grid.rebuild(self.pos).pairs()
+
+    def neighbour_sums(self):
+        """Return `(count, separation_sum, velocity_sum, position_sum)` over every boid's neighbours.
+
+        Exact, unless `config.opening_angle` is above zero: then the quadtree
+        approximation from `quadtree.neighbour_sums` is used.
+        """
+        opening_angle = getattr(self.config, "opening_angle", 0)
+        if opening_angle > 0:
+            extent = max(self.width, self.height)
+            return quadtree.neighbour_sums(self.pos, self.move, float(self.config.radius), opening_angle, extent)
+
+        n = len(self.pos)
+        neighbours = np.zeros(n)
+        separation_sum = np.zeros((n, 2))
+        velocity_sum = np.zeros((n, 2))
+        position_sum = np.zeros((n, 2))
+
+        for i, j, diff, dist in self.neighbour_pairs():
+            neighbours += np.bincount(i, minlength=n)
+
+            # Unit vectors away from each neighbour; coincident boids add nothing.
+            unit = diff / np.maximum(dist, 0.1)[:, None]
+            unit[dist == 0] = 0
+            for axis in (0, 1):
+                separation_sum[:, axis] += np.bincount(i, weights=unit[:, axis], minlength=n)
+                velocity_sum[:, axis] += np.bincount(i, weights=self.move[j, axis], minlength=n)
+                position_sum[:, axis] += np.bincount(i, weights=self.pos[j, axis], minlength=n)
+
+        return neighbours, separation_sum, velocity_sum, position_sum
+
+    def forces(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Return the `(alignment, separation, cohesion)` vectors of every boid."""
+        n = len(self.pos)
+        neighbours, separation_sum, velocity_sum, position_sum = self.neighbour_sums()
+
+        has_neighbours = neighbours > 0
+        scale = np.zeros(n)
+        scale[has_neighbours] = 1 / neighbours[has_neighbours]
+
+        separation = separation_sum * scale[:, None]
+        alignment = np.where(has_neighbours[:, None], velocity_sum * scale[:, None] - self.move, 0)
+        cohesion = np.where(has_neighbours[:, None], position_sum * scale[:, None] - self.pos, 0)
+        return alignment, separation, cohesion
+
+    def step(self) -> None:
+        """Advance every boid by one tick."""
+        config = self.config
+        alignment, separation, cohesion = self.forces()
+
+        # Same weighting as FlockingAgent.change_position.
+        alpha, beta, gamma = config.weights()
+        self.move += (alignment * alpha + separation * beta + cohesion * gamma) / config.mass
+
+        # Cap the velocity
+        speed = np.hypot(self.move[:, 0], self.move[:, 1])
+        too_fast = speed > config.max_velocity
+        self.move[too_fast] *= (config.max_velocity / speed[too_fast])[:, None]
+
+        self.pos += self.move * config.delta_time
+        self.there_is_no_escape()
+        self.ticks += 1
+
+    def there_is_no_escape(self) -> None:
+        # Vectorised `Agent.there_is_no_escape`: wrap around to the opposite edge.
+        x = self.pos[:, 0]
+        y = self.pos[:, 1]
+        x[x < 0] = self.width
+        x[x > self.width] = 0
+        y[y < 0] = self.height
+        y[y > self.height] = 0
+
+    def run(self, ticks: int) -> BoidsEngine:
+        for _ in range(ticks):
+            self.step()
+        return self
@@ -1,8 +1,15 @@
 from dataclasses import dataclass
+from pathlib import Path
 import random
+import sys
 
 from pygame import Vector2
-from vi import Agent, Config, Simulation
+from vi import Agent, Config, HeadlessSimulation, Simulation
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / "Common"))
+from boids import BoidsEngine
+from spatial_hash import use_spatial_hash
+from swarm_metrics import SwarmRecorder
 
 
 @dataclass
@@ -14,6 +21,9 @@ class FlockingConfig(Config):
     mass: int = 20
     max_velocity: float = 5.0
     radius: float = 50.0
+    engine: str = "agents"  # "agents" or "numpy" (vectorised BoidsEngine)
+    proximity: str = "chunks"  # "chunks" (Violet's engine) or "spatial_hash"
+    opening_angle: float = 0.0  # > 0: approximate far neighbours with a quadtree (numpy engine only)
 
     def weights(self) -> tuple[float, float, float]:
         return (self.alignment_weight, self.cohesion_weight, self.
@@ -24,6 +34,9 @@ class FlockingAgent(Agent[FlockingConfig]):
     # By overriding `change_position`, the default behaviour is overwritten.
     # Without making changes, the agents won't move.
     def change_position(self):
+        if self.config.engine == "numpy":
+            return  # moved by the simulation's BoidsEngine instead
+
         neighbors = self.in_proximity_performance()
         neighbor_positions = []
         neighbor_velocities = []
@@ -86,21 +99,70 @@ class FlockingAgent(Agent[FlockingConfig]):
 
         # TODO: Modify self.move and self.pos accordingly.
 
+
+class HeadlessBoidsSimulation(HeadlessSimulation[FlockingConfig]):
+    # Simulation where the BoidsEngine moves all FlockingAgents in one batched pass.
+    engine: BoidsEngine | None = None
+
+    def before_update(self):
+        super().before_update()
+        agents = self._agents.sprites()
+        if self.engine is None:
+            self.engine = BoidsEngine.from_agents(self.config, agents)
+        self.engine.step()
+        self.engine.write_to(agents)
+
+
+class BoidsSimulation(HeadlessBoidsSimulation, Simulation[FlockingConfig]):
+    # Windowed version of HeadlessBoidsSimulation.
+    pass
+
+
+def new_simulation(config: FlockingConfig, headless: bool = False) -> HeadlessSimulation:
+    if config.engine == "numpy":
+        simulation = (HeadlessBoidsSimulation if headless else BoidsSimulation)(config)
+    else:
+        simulation = (HeadlessSimulation if headless else Simulation)(config)
+    if config.proximity == "spatial_hash":
+        use_spatial_hash(simulation)
+    return simulation
+
+
+def run_headless(config: FlockingConfig, count: int, ticks: int, seed: int | None = None,
+                 width: float | None = None, height: float | None = None,
+                 metrics_path: str | None = None, metrics_every: int = 10) -> BoidsEngine:
+    # No agents, no window: just the arrays. This is the path for 50k+ boids.
+    # With `metrics_path`, the swarm metrics of every `metrics_every`-th tick are written there.
+    engine = BoidsEngine.spawn(config, count, seed=seed, width=width, height=height)
+    if metrics_path is None:
+        return engine.run(ticks)
+
+    recorder = SwarmRecorder(metrics_path, every=metrics_every, cluster_radius=config.radius)
+    try:
+        for tick in range(ticks + 1):
+            if recorder.due(tick):
+                recorder.record(tick, engine.pos, engine.move)
+            if tick < ticks:
+                engine.step()
+    finally:
+        recorder.close()
+    return engine
+
+
 def run_sim():
+    # TODO: Modify `movement_speed` and `radius` and observe the change in behaviour.
+    config = FlockingConfig(
+        image_rotation=True,
+        movement_speed=500,
+        radius=200,
+        alignment_weight=0.01,
+        cohesion_weight=0.01,
+        separation_weight=0.1,
+        delta_time=1,
+        max_velocity=7.0
+    )
     (
-        Simulation(
-            # TODO: Modify `movement_speed` and `radius` and observe the change in behaviour.
-            FlockingConfig(
-                image_rotation=True,
-                movement_speed=500,
-                radius=200,
-                alignment_weight=0.01,
-                cohesion_weight=0.01,
-                separation_weight=0.1,
-                delta_time=1,
-                max_velocity=7.0
-            )
-        )
+        new_simulation(config)
         .batch_spawn_agents(50, FlockingAgent, images=["../images/triangle.png"])
         .run()
     )
@@ -1,8 +1,18 @@
 from dataclasses import dataclass
+from pathlib import Path
 import random
+import sys
 
+import numpy as np
 from pygame import Vector2
-from vi import Agent, Config, Simulation
+from vi import Agent, Config, HeadlessSimulation, Simulation
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / "Common"))
+from broadcast import use_broadcast_table
+from nearest import use_nearest_index
+from neighbor_cache import use_neighbor_cache
+from spatial_hash import use_spatial_hash
+from swarm_metrics import SwarmRecorder
 
 
 @dataclass
@@ -14,7 +24,9 @@ class FlockingConfig(Config):
     mass: int = 20
     max_velocity: float = 5.0
     radius: float = 50.0
-
+    proximity: str = "chunks"  # "chunks" (Violet's engine) or "spatial_hash"
+    neighbor_cache: bool = False  # compute each agent's neighbours at most once per tick
+    report: bool = False  # print the predator table and neighbour cache counters after the run
 
     pred_pursuit_weight: float = 1.0
     pred_mass: int = 30
@@ -36,20 +48,15 @@ class PredatorAgent(Agent[Config]):
             random.uniform(0, self.config.height)
         )
         self.move = Vector2(random.uniform(-1, 1), random.uniform(-1, 1)).normalize() * self.config.pred_max_velocity * 0.5
+        # Prey find predators through this table instead of their neighbour lists.
+        self.shared.predator_table.register(self)
 
     def change_position(self):
-        # Get nearby FlockingAgents within radius
-        prey_positions = []
-        for neighbor in self.in_proximity_performance():
-            if isinstance(neighbor, FlockingAgent):  # Only consider FlockingAgents as prey
-                prey_positions.append(neighbor.pos)
-
-        # Pursuit: Steer towards the closest FlockingAgent
+        # Pursuit: Steer towards the closest FlockingAgent within pred_radius
         pursuit = Vector2(0, 0)
-        if prey_positions:
-            # Find the closest prey
-            closest_prey = min(prey_positions, key=lambda pos: (self.pos - pos).length())
-            diff = closest_prey - self.pos
+        closest_prey = self.shared.nearest_prey.nearest(self)
+        if closest_prey is not None:
+            diff = closest_prey.pos - self.pos
             if diff.length() > 0:  # Avoid division by zero
                 pursuit = diff / diff.length()  # Normalize to steer toward prey
 
@@ -71,33 +78,27 @@ class PredatorAgent(Agent[Config]):
 
 
 class FlockingAgent(Agent[FlockingConfig]):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Predators find their closest prey through this table.
+        self.shared.prey_table.register(self)
+
     # By overriding `change_position`, the default behaviour is overwritten.
     # Without making changes, the agents won't move.
     def change_position(self):
-        neighbors = self.in_proximity_performance()
+        neighbors = list(self.in_proximity_performance())
         neighbor_positions = []
         neighbor_velocities = []
 
-        # Detect predators in a radius of 100 and avoid them
-        neighbors = self.in_proximity_performance()
-        predators = [n for n in neighbors if isinstance(n, PredatorAgent)]
-        predators_to_avoid = []
+        # Detect predators within pred_radius and avoid them
+        predators, diffs, distances = self.shared.predator_table.within(self.pos, self.config.pred_radius)
 
-        for predator in predators:
-            # if distance from predator is less than 10 add to avoidance vector
-            if (self.pos - predator.pos).length() < self.config.pred_radius:
-                predators_to_avoid.append(predator)
-
-        if predators_to_avoid:
-            print('Predator detected! FlockingAgent will avoid it.')
+        if predators:
             # Calculate avoidance vector
-            avoidance_vector = Vector2(0, 0)
-            for predator in predators:
-                diff = self.pos - predator.pos
-                if diff.length() > 0:
-                    avoidance_vector += diff / diff.length()
+            apart = distances > 0  # Avoid division by zero
+            avoidance = (diffs[apart] / distances[apart, None]).sum(axis=0)
             # Average the avoidance vector
-            avoidance_vector /= len(predators)
+            avoidance_vector = Vector2(*avoidance) / len(predators)
             # Normalize and scale the avoidance vector to ensure realistic movement
             if avoidance_vector.length() > 0:
                 avoidance_vector = avoidance_vector.normalize() * 2.0  # Scale and normalize
@@ -108,7 +109,6 @@ class FlockingAgent(Agent[FlockingConfig]):
                 self.move = self.move.normalize() * self.config.max_velocity
 
 
-        neighbors = self.in_proximity_performance()
         for neighbor in neighbors:
             neighbor_positions.append(neighbor.pos)
             neighbor_velocities.append(neighbor.move)
@@ -167,25 +167,74 @@ class FlockingAgent(Agent[FlockingConfig]):
 
         # TODO: Modify self.move and self.pos accordingly.
 
+def new_simulation(config: FlockingConfig, headless: bool = False) -> HeadlessSimulation:
+    simulation = (HeadlessSimulation if headless else Simulation)(config)
+    predators = use_broadcast_table(simulation, "predator_table")
+    prey = use_broadcast_table(simulation, "prey_table")
+    use_nearest_index(simulation, "nearest_prey", targets=prey, seekers=predators, radius=config.pred_radius)
+    if config.proximity == "spatial_hash":
+        use_spatial_hash(simulation)
+    if config.neighbor_cache:
+        use_neighbor_cache(simulation)
+    return simulation
+
+
+def _state(agents) -> tuple[np.ndarray, np.ndarray]:
+    # (positions, velocities) of `agents` as (n, 2) arrays.
+    state = np.array([(agent.pos.x, agent.pos.y, agent.move.x, agent.move.y) for agent in agents], dtype=np.float64)
+    state = state.reshape(-1, 4)
+    return state[:, :2], state[:, 2:]
+
+
+def run_headless(config: FlockingConfig, prey: int, predators: int, ticks: int,
+                 metrics_path: str | None = None, metrics_every: int = 10) -> HeadlessSimulation:
+    # No window. With `metrics_path`, the swarm metrics of the prey (and their distance
+    # to the closest predator) of every `metrics_every`-th tick are written there.
+    images = Path(__file__).resolve().parent.parent / "images"
+    simulation = new_simulation(config, headless=True)
+    simulation.batch_spawn_agents(prey, FlockingAgent, images=[str(images / "triangle.png")])
+    simulation.batch_spawn_agents(predators, PredatorAgent, images=[str(images / "triangle@50px.png")])
+
+    recorder = None if metrics_path is None else SwarmRecorder(metrics_path, every=metrics_every,
+                                                               cluster_radius=config.radius)
+    try:
+        # Tick 0 is the starting state, as in flocking.run_headless.
+        for tick in range(ticks + 1):
+            if recorder is not None and recorder.due(tick):
+                prey_pos, prey_move = _state(simulation.shared.prey_table.members)
+                predator_pos, _ = _state(simulation.shared.predator_table.members)
+                recorder.record(tick, prey_pos, prey_move, predator_pos)
+            if tick < ticks:
+                simulation.tick()
+    finally:
+        if recorder is not None:
+            recorder.close()
+    return simulation
+
+
 def run_sim():
+    # TODO: Modify `movement_speed` and `radius` and observe the change in behaviour.
+    config = FlockingConfig(
+        image_rotation=True,
+        movement_speed=500,
+        radius=200,
+        alignment_weight=0.01,
+        cohesion_weight=0.01,
+        separation_weight=0.1,
+        delta_time=1,
+        max_velocity=7.0
+    )
+    simulation = new_simulation(config)
     (
-        Simulation(
-            # TODO: Modify `movement_speed` and `radius` and observe the change in behaviour.
-            FlockingConfig(
-                image_rotation=True,
-                movement_speed=500,
-                radius=200,
-                alignment_weight=0.01,
-                cohesion_weight=0.01,
-                separation_weight=0.1,
-                delta_time=1,
-                max_velocity=7.0
-            )
-        )
+        simulation
         .batch_spawn_agents(50, FlockingAgent, images=["../images/triangle.png"])
         .batch_spawn_agents(2, PredatorAgent, images=["../images/triangle@50px.png"])
         .run()
     )
+    if config.report:
+        print(simulation.shared.predator_table.report("predator table"))
+        if config.neighbor_cache:
+            print(simulation.shared.neighbor_cache.report())
 
 if __name__ == "__main__":
     run_sim()
@@ -0,0 +1,195 @@
+"""Parameter sweeps over `FlockingConfig` fields.
+
+Instead of hand-editing `run_sim`, describe the points to run:
+
+    # every combination
+    uv run sweep.py grid --param alignment_weight 0.01 0.1 0.5 --param radius 50 200 --seeds 5
+    # 200 points drawn uniformly / as a Latin hypercube from the ranges
+    uv run sweep.py random --range cohesion_weight 0 0.5 --range max_velocity 2 10 --samples 200
+    uv run sweep.py lhs --range cohesion_weight 0 0.5 --range max_velocity 2 10 --samples 200
+
+Every point runs `--seeds` times. A run is one headless `BoidsEngine` of `--agents`
+boids on the `run_sim` settings for `--ticks` ticks, after which its swarm
+metrics (see `swarm_metrics`) are recorded. Runs are spread over a process pool
+with one run per worker at a time, by default one worker per core.
+
+Seeds are controlled: replicate `r` of every point uses the same seed, derived
+from `--seed` and `r`, so points are compared on the same starting flocks.
+
+Results go to one table in `--out` (a `ColumnarWriter` directory), one row per
+run keyed by the swept fields and `seed`. Finished runs are written out every
+30 seconds (or 256 runs) and merged into a single file at the end. A sweep
+started again with the same `--out` skips the runs already in there, so a
+killed sweep picks up where it stopped. Read the results with
+
+    columnar.scan("sweep").collect()
+"""
+from __future__ import annotations
+
+import argparse
+import dataclasses
+import itertools
+import multiprocessing
+import os
+from pathlib import Path
+import sys
+import time
+import typing
+
+import numpy as np
+from scipy.stats import qmc
+
+from flocking import FlockingConfig, run_headless
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / "Common"))
+from columnar import ColumnarWriter, scan
+from ensemble import replica_seed
+import swarm_metrics
+
+# The run_sim settings every point starts from.
+BASE = {
+    "movement_speed": 500,
+    "radius": 200,
+    "alignment_weight": 0.01,
+    "cohesion_weight": 0.01,
+    "separation_weight": 0.1,
+    "delta_time": 1,
+    "max_velocity": 7.0,
+}
+
+
+# Finished runs are written out in parts of this many rows, or at least this often.
+FLUSH_ROWS = 256
+FLUSH_SECONDS = 30.0
+
+
+def _field_types() -> dict[str, type]:
+    # Violet's own fields (`duration`, `seed`, ...) are annotated as strings; resolve them.
+    hints = typing.get_type_hints(FlockingConfig)
+    return {field.name: hints[field.name] for field in dataclasses.fields(FlockingConfig)}
+
+
+def _cast(name: str, value):
+    # Integer fields (e.g. `mass`, `duration`, `seed`) stay integers.
+    options = typing.get_args(_field_types()[name]) or (_field_types()[name],)
+    return int(round(value)) if int in options and float not in options else float(value)
+
+
+def grid(values: dict[str, list[float]]) -> list[dict]:
+    names = list(values)
+    return [dict(zip(names, combination)) for combination in itertools.product(*values.values())]
+
+
+def random_design(ranges: dict[str, tuple[float, float]], samples: int, seed: int) -> list[dict]:
+    rng = np.random.default_rng(seed)
+    low, high = np.array(list(ranges.values()), dtype=np.float64).T
+    points = rng.uniform(low, high, size=(samples, len(ranges)))
+    return [dict(zip(ranges, point.tolist())) for point in points]
+
+
+def latin_hypercube(ranges: dict[str, tuple[float, float]], samples: int, seed: int) -> list[dict]:
+    low, high = np.array(list(ranges.values()), dtype=np.float64).T
+    unit = qmc.LatinHypercube(d=len(ranges), seed=seed).random(samples)
+    points = qmc.scale(unit, low, high) if len(ranges) else unit
+    return [dict(zip(ranges, point.tolist())) for point in points]
+
+
+def _run(task: dict) -> dict:
+    params, seed = task["params"], task["seed"]
+    config = FlockingConfig(**{**BASE, **params})
+    start = time.perf_counter()
+    engine = run_headless(config, task["agents"], task["ticks"], seed=seed)
+    return {
+        **params,
+        "seed": seed,
+        "replicate": task["replicate"],
+        "agents": task["agents"],
+        "ticks": task["ticks"],
+        "polarization": swarm_metrics.polarization(engine.move),
+        "mean_nearest_distance": swarm_metrics.mean_nearest_distance(engine.pos),
+        "clusters": swarm_metrics.cluster_count(engine.pos, config.radius),
+        "seconds": time.perf_counter() - start,
+    }
+
+
+def _key(params: dict, seed: int) -> tuple:
+    return tuple(sorted(params.items())) + (("seed", seed),)
+
+
+def _finished(out: Path, names: list[str]) -> set[tuple]:
+    if not any(out.glob("part-*.parquet")):
+        return set()
+    rows = scan(out).select(*names, "seed").collect().to_dicts()
+    return {_key({name: row[name] for name in names}, row["seed"]) for row in rows}
+
+
+def sweep(points: list[dict], seeds: int, agents: int, ticks: int, out: str | Path,
+          base_seed: int = 0, workers: int | None = None) -> None:
+    out = Path(out)
+    points = [{name: _cast(name, value) for name, value in point.items()} for point in points]
+    names = sorted(points[0]) if points else []
+
+    tasks = [
+        {"params": point, "seed": replica_seed(base_seed, replicate), "replicate": replicate,
+         "agents": agents, "ticks": ticks}
+        for point in points
+        for replicate in range(seeds)
+    ]
+    workers = workers or os.cpu_count()
+    # Results are flushed every FLUSH_SECONDS at the latest, so a killed sweep loses at most
+    # that much work besides the runs in flight; the parts are merged into one at the end.
+    # The writer is opened first: it recovers from a compaction that was cut short.
+    with ColumnarWriter(out, chunk_rows=FLUSH_ROWS, append=True) as writer:
+        done = _finished(out, names)
+        todo = [task for task in tasks if _key(task["params"], task["seed"]) not in done]
+        print(f"{len(tasks)} runs, {len(tasks) - len(todo)} already in {out}, {len(todo)} to go")
+        with multiprocessing.Pool(workers) as pool:
+            flushed = time.monotonic()
+            for finished, row in enumerate(pool.imap_unordered(_run, todo), start=1):
+                writer.append(**row)
+                if time.monotonic() - flushed >= FLUSH_SECONDS:
+                    writer.flush()
+                    flushed = time.monotonic()
+                if finished % max(1, len(todo) // 20) == 0 or finished == len(todo):
+                    print(f"{finished}/{len(todo)} runs done")
+        writer.compact()
+
+
+def _parse_values(pairs: list[list[str]]) -> dict[str, list[float]]:
+    fields = _field_types()
+    values = {}
+    for name, *items in pairs:
+        if name not in fields:
+            raise SystemExit(f"unknown FlockingConfig field '{name}'")
+        values[name] = [float(item) for item in items]
+    return values
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("design", choices=["grid", "random", "lhs"])
+    parser.add_argument("--param", nargs="+", action="append", default=[], metavar=("FIELD", "VALUE"),
+                        help="grid: a field and the values to try")
+    parser.add_argument("--range", nargs=3, action="append", default=[], metavar=("FIELD", "LOW", "HIGH"),
+                        help="random/lhs: a field and the range to draw it from")
+    parser.add_argument("--samples", type=int, default=100, help="random/lhs: number of points")
+    parser.add_argument("--seeds", type=int, default=3, help="runs per point")
+    parser.add_argument("--agents", type=int, default=500)
+    parser.add_argument("--ticks", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0, help="base seed for the design and the runs")
+    parser.add_argument("--workers", type=int, default=None, help="default: one per core")
+    parser.add_argument("--out", default="sweep")
+    args = parser.parse_args()
+
+    if args.design == "grid":
+        points = grid(_parse_values(args.param))
+    else:
+        ranges = {name: tuple(bounds) for name, bounds in _parse_values(args.range).items()}
+        design = random_design if args.design == "random" else latin_hypercube
+        points = design(ranges, args.samples, args.seed)
+
+    sweep(points, args.seeds, args.agents, args.ticks, args.out, base_seed=args.seed, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+"""Array-based births and deaths for the extended predator-prey model.
+
+Every birth in `pred-prey-simple-extended.py` is `Agent.reproduce`: a copied
+pygame sprite, a new entry in the simulation's sprite groups and proximity
+chunks, and a fresh `__dict__`. Every death is `kill`, which takes it out of
+them again. With a few thousand prey that breed and die of age, that churn is
+most of what the model does.
+
+`PredatorPreyEngine` keeps prey and predators in a `StateStore` each instead:
+one typed column per field (`x`, `y`, `move_x`, `move_y`, `age`, `ticks`,
+the breeding counters and the predators' `energy`) and an `alive` mask. A death
+clears the agent's bit in the mask. Births take their slots from the store's
+free list first, and the store doubles its columns when it runs out, so a
+population that grows and shrinks reuses the same memory. Each tick applies
+every rule to all agents of a kind at once:
+
+- movement: Violet's `change_position` (wrap around the window, turn by up to
+  30 degrees on wrapping and by up to 10 on a quarter of the ticks, step);
+- prey: age every 60 ticks and die at `max_prey_age`; once `prey_breeding_delay`
+  ticks have passed since the last birth, breed with the Gaussian chance of
+  their age; step at `movement_speed`;
+- predators: age and die at `max_predator_age` likewise; lose
+  `energy_decrease_per_step` and starve at 0; below `predator_energy_to_hunt`,
+  kill a prey from their proximity chunk with the hunt chance of their age and
+  gain `energy_gain_per_prey` (up to 100); breed every
+  `predator_breeding_delay` ticks with enough energy, from age 2; step.
+
+As in the agent model, newborns copy their parent's position and heading and
+start updating on the next tick, agents that die during their own update
+finish it, and a predator only sees the prey in its own chunk of
+`2 * radius` as they were after moving. All prey update before the predators,
+which is the order they were spawned in.
+
+The behaviour is statistically equivalent, not identical, to the agents':
+the engine draws from its own NumPy generator. Predators sharing a chunk hunt in
+rounds, one predator per chunk per round; each succeeds with the chance that
+one of its draws over the prey left in the chunk would have, and takes one of
+them at random.
+
+    engine = PredatorPreyEngine.spawn(config, 2000, 25, "../images/prey.png", "../images/predator.png", seed=1)
+    population = PopulationCounter(("predator", "prey"), max_age=12)
+    engine.run(config.duration + 1, population)
+"""
+from __future__ import annotations
+
+from pathlib import Path
+import sys
+
+import numpy as np
+import pygame as pg
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / "Common"))
+from age_table import gaussian_age_table
+from state_store import StateStore
+
+AGE_EVERY = 60  # ticks between two birthdays
+MAX_ENERGY = 100  # a predator's energy is capped here after a meal
+
+PREY_FIELDS = {"x": "float64", "y": "float64", "move_x": "float64", "move_y": "float64",
+               "age": "int32", "ticks": "int32", "last_reproduced_ticks": "int32"}
+PREDATOR_FIELDS = {"x": "float64", "y": "float64", "move_x": "float64", "move_y": "float64",
+                   "age": "int32", "ticks": "int32", "reproduced_ticks_ago": "int32", "energy": "float32"}
+
+
+class PredatorPreyEngine:
+    def __init__(self, config, prey_pos: np.ndarray, predator_pos: np.ndarray, seed: int | None = None):
+        self.config = config
+        self.rng = np.random.default_rng(seed)
+        self.width, self.height = (float(size) for size in config.window.as_tuple())
+        self.chunk_size = config.radius * 2
+        self.counter = 0
+
+        # The engine is its own `shared`: slots freed during a tick are reused from the next one.
+        self.prey = StateStore(PREY_FIELDS, shared=self)
+        self.predators = StateStore(PREDATOR_FIELDS, shared=self)
+        self._births = {"prey": 0, "predator": 0}
+        self._deaths = {"prey": 0, "predator": 0}
+
+        for store, pos in ((self.prey, prey_pos), (self.predators, predator_pos)):
+            pos = np.asarray(pos, dtype=np.float64).reshape(-1, 2)
+            slots = store.allocate_many(len(pos))
+            store.columns["x"][slots], store.columns["y"][slots] = pos.T
+            angle = np.radians(self.rng.uniform(0, 360, len(pos)))
+            store.columns["move_x"][slots] = config.movement_speed * np.cos(angle)
+            store.columns["move_y"][slots] = config.movement_speed * np.sin(angle)
+        self.predators.columns["energy"][:self.predators.size] = config.predator_start_energy
+
+        self.hunt_success = gaussian_age_table(config.max_predator_age)
+        self.breeding_chance = gaussian_age_table(config.max_prey_age, config.prey_max_breeding_chance)
+
+    @classmethod
+    def spawn(cls, config, prey: int, predators: int, prey_image: str, predator_image: str,
+              seed: int | None = None) -> PredatorPreyEngine:
+        """`prey` and `predators` at random positions, their images fully inside the window."""
+        rng = np.random.default_rng(seed)
+        width, height = config.window.as_tuple()
+
+        def place(count: int, image: str) -> np.ndarray:
+            half_width, half_height = (size / 2 for size in pg.image.load(image).get_size())
+            return rng.uniform((half_width, half_height), (width - half_width, height - half_height), size=(count, 2))
+
+        return cls(config, place(prey, prey_image), place(predators, predator_image), seed=rng.integers(2 ** 63))
+
+    def __len__(self) -> int:
+        return len(self.prey) + len(self.predators)
+
+    def _live(self, store: StateStore) -> np.ndarray:
+        return np.flatnonzero(store.alive[:store.size])
+
+    def _chunks(self, store: StateStore, slots: np.ndarray) -> np.ndarray:
+        # One integer per proximity chunk of the agents' rounded positions, as Violet's chunks.
+        x = np.round(store.columns["x"][slots]).astype(np.int64) // self.chunk_size
+        y = np.round(store.columns["y"][slots]).astype(np.int64) // self.chunk_size
+        return (x << 32) + y
+
+    def change_position(self, store: StateStore) -> None:
+        # Vectorised `Agent.change_position`: wrap around the window, turn, step.
+        slots = self._live(store)
+        x, y = store.columns["x"], store.columns["y"]
+        px, py = x[slots], y[slots]
+        wrapped = (px < 0) | (px > self.width) | (py < 0) | (py > self.height)
+        x[slots] = np.where(px < 0, self.width, np.where(px > self.width, 0, px))
+        y[slots] = np.where(py < 0, self.height, np.where(py > self.height, 0, py))
+
+        turn = self.rng.uniform(-30, 30, len(slots))
+        self._rotate(store, slots[wrapped], turn[wrapped])
+        change = self.rng.random(len(slots)) < 0.25
+        turn = self.rng.uniform(-10, 10, len(slots))
+        self._rotate(store, slots[change], turn[change])
+        x[slots] += store.columns["move_x"][slots]
+        y[slots] += store.columns["move_y"][slots]
+
+    def _rotate(self, store: StateStore, slots: np.ndarray, degrees: np.ndarray) -> None:
+        angle = np.radians(degrees)
+        cos, sin = np.cos(angle), np.sin(angle)
+        move_x, move_y = store.columns["move_x"], store.columns["move_y"]
+        mx, my = move_x[slots], move_y[slots]
+        move_x[slots] = mx * cos - my * sin
+        move_y[slots] = mx * sin + my * cos
+
+    def _age(self, store: StateStore, slots: np.ndarray, max_age: int) -> np.ndarray:
+        # `ticks += 1` and `check_age` for `slots`; returns the ones that died of age.
+        ticks = store.columns["ticks"]
+        ticks[slots] += 1
+        birthday = slots[ticks[slots] % AGE_EVERY == 0]
+        store.columns["age"][birthday] += 1
+        return birthday[store.columns["age"][birthday] >= max_age]
+
+    def _kill(self, kind: str, store: StateStore, slots: np.ndarray) -> None:
+        slots = slots[store.alive[slots]]
+        store.release_many(slots)
+        self._deaths[kind] += len(slots)
+
+    def _reproduce(self, kind: str, store: StateStore, parents: np.ndarray) -> np.ndarray:
+        # Newborns copy their parents' position and heading; every other field starts at 0.
+        copied = {name: store.columns[name][parents] for name in ("x", "y", "move_x", "move_y")}
+        children = store.allocate_many(len(parents))
+        for name, values in copied.items():
+            store.columns[name][children] = values
+        self._births[kind] += len(children)
+        return children
+
+    def _step_forward(self, store: StateStore, slots: np.ndarray) -> None:
+        store.columns["x"][slots] += store.columns["move_x"][slots] * self.config.movement_speed
+        store.columns["y"][slots] += store.columns["move_y"][slots] * self.config.movement_speed
+
+    def update_prey(self, slots: np.ndarray) -> None:
+        config = self.config
+        self._kill("prey", self.prey, self._age(self.prey, slots, config.max_prey_age))
+
+        last_reproduced = self.prey.columns["last_reproduced_ticks"]
+        last_reproduced[slots] += 1
+        ready = slots[last_reproduced[slots] >= config.prey_breeding_delay]
+        parents = ready[self.breeding_chance.draw(self.prey.columns["age"][ready], self.rng)]
+        last_reproduced[parents] = 0
+        self._reproduce("prey", self.prey, parents)
+
+        self._step_forward(self.prey, slots)
+
+    def hunt(self, hunters: np.ndarray, prey: np.ndarray, prey_chunks: np.ndarray) -> np.ndarray:
+        """Which of `hunters` catch one of `prey` (slots with their chunks), killing it."""
+        fed = np.zeros(len(hunters), dtype=bool)
+        if not len(hunters) or not len(prey):
+            return fed
+
+        order = np.argsort(prey_chunks, kind="stable")
+        prey, prey_chunks = prey[order], prey_chunks[order]
+        hunter_chunks = self._chunks(self.predators, hunters)
+        first = np.searchsorted(prey_chunks, hunter_chunks, side="left")
+        last = np.searchsorted(prey_chunks, hunter_chunks, side="right")
+
+        # Hunters sharing a chunk take turns in slot order: their rank within the chunk.
+        by_chunk = np.argsort(hunter_chunks, kind="stable")
+        sorted_chunks = hunter_chunks[by_chunk]
+        starts = np.searchsorted(sorted_chunks, sorted_chunks, side="left")
+        rank = np.empty(len(hunters), dtype=np.int64)
+        rank[by_chunk] = np.arange(len(hunters)) - starts
+
+        chance = self.hunt_success.lookup(self.predators.columns["age"][hunters])
+        remaining = np.ones(len(prey), dtype=bool)
+        for turn in range(int(rank.max()) + 1):
+            turn = np.flatnonzero(rank == turn)
+            left = np.concatenate(([0], np.cumsum(remaining)))
+            found = left[last[turn]] - left[first[turn]]
+            # One draw per prey until one succeeds, as `detect_prey`, in a single draw.
+            caught = (found > 0) & (self.rng.random(len(turn)) < 1 - (1 - chance[turn]) ** found)
+            turn, found = turn[caught], found[caught]
+            pick = left[first[turn]] + self.rng.integers(0, found) + 1
+            remaining[np.searchsorted(left, pick, side="left") - 1] = False
+            fed[turn] = True
+
+        self._kill("prey", self.prey, prey[~remaining])
+        return fed
+
+    def update_predators(self, slots: np.ndarray, prey: np.ndarray, prey_chunks: np.ndarray) -> None:
+        config = self.config
+        store = self.predators
+        self._kill("predator", store, self._age(store, slots, config.max_predator_age))
+
+        energy = store.columns["energy"]
+        energy[slots] -= config.energy_decrease_per_step
+        self._kill("predator", store, slots[energy[slots] <= 0])
+
+        living = slots[store.alive[slots]]
+        hunters = living[energy[living] < config.predator_energy_to_hunt]
+        # Prey born this tick aren't in the chunks yet; prey that died since are skipped.
+        fed = hunters[self.hunt(hunters, prey[self.prey.alive[prey]], prey_chunks[self.prey.alive[prey]])]
+        energy[fed] = np.minimum(energy[fed] + config.energy_gain_per_prey, MAX_ENERGY)
+
+        reproduced = store.columns["reproduced_ticks_ago"]
+        reproduced[slots] += 1
+        ready = ((reproduced[slots] >= config.predator_breeding_delay)
+                 & (energy[slots] >= config.repro_energy_threshold) & (store.columns["age"][slots] > 1))
+        parents = slots[ready]
+        energy[parents] -= config.repro_energy_cost
+        reproduced[parents] = 0
+        children = self._reproduce("predator", store, parents)
+        store.columns["energy"][children] = config.predator_start_energy
+
+        self._step_forward(store, slots)
+
+    def step(self) -> None:
+        """Advance every agent by one tick."""
+        self.change_position(self.prey)
+        self.change_position(self.predators)
+        prey = self._live(self.prey)
+        predators = self._live(self.predators)
+        prey_chunks = self._chunks(self.prey, prey)
+
+        self.update_prey(prey)
+        self.update_predators(predators, prey, prey_chunks)
+        self.counter += 1
+
+    def observe(self, population) -> None:
+        """Hand the live agents' ages, and the births and deaths since the last call, to a `PopulationCounter`."""
+        for kind, store in (("prey", self.prey), ("predator", self.predators)):
+            population.observe(kind, store.columns["age"][self._live(store)], self._births[kind], self._deaths[kind])
+            self._births[kind] = self._deaths[kind] = 0
+
+    def run(self, ticks: int, population=None) -> PredatorPreyEngine:
+        """Step `ticks` times; a `PopulationCounter` gets one row per tick, as from the agent model."""
+        if population is not None:
+            self.observe(population)
+            population.start()
+        for _ in range(ticks):
+            self.step()
+            if population is not None:
+                self.observe(population)
+                population.close(self.counter - 1)
+        return self
@@ -1,13 +1,22 @@
 import json
 import random
 from dataclasses import dataclass, field
-import math
 from numpy.testing.print_coercion_tables import print_coercion_table
 from vi import Agent, Config, Simulation, Window, HeadlessSimulation
 from vi.util import count, probability
 import polars as pl
 import matplotlib.pyplot as plt
 import time
+from pathlib import Path
+import sys
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / "Common"))
+from age_table import gaussian_age_table
+from population import Counted, PopulationCounter, use_population_counter
+from snapshot_sink import scan_snapshots, use_snapshot_sink
+from typed_proximity import TypedQueries, use_typed_proximity
+from population_engine import PredatorPreyEngine
+
 @dataclass
 class PredatorPreyConfig(Config):
     width : int = 100
@@ -30,6 +39,8 @@ class PredatorPreyConfig(Config):
 
     prey_max_breeding_chance: float = 0.005  # Maximum breeding chance for prey
     prey_breeding_delay: int = 10  # Ticks before prey can reproduce again
+    snapshots: str = ""  # directory to stream per-agent kind/age snapshots to (see snapshot_sink.py); empty for none
+    engine: str = "agents"  # "arrays" runs the same rules on typed arrays instead (see population_engine.py)
 
 
 class CustomSimulation(Simulation):
@@ -37,7 +48,9 @@ class CustomSimulation(Simulation):
         super().__init__(*args, **kwargs)
 
 
-class Predator(Agent[PredatorPreyConfig]):
+class Predator(Counted, TypedQueries, Agent[PredatorPreyConfig]):
+    kind = 'predator'
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.death_chance = 0.05  # Chance of dying from starvation
@@ -47,31 +60,13 @@ class Predator(Agent[PredatorPreyConfig]):
         self.reproduced_ticks_ago = 0  # Ticks since last reproduction
 
     def calculate_hunt_success(self) -> float:
-        # Calculate the hunting success probability based on age resulting in a normal distribution
-        if self.age < 0 or self.config.max_predator_age <= 0 or self.age > self.config.max_predator_age:
-                return 0.0
-
-        # Mean is at the midpoint of max_age
-        mean = self.config.max_predator_age / 2
-        # Standard deviation is set to max_age/4 for a reasonable spread
-        std_dev = self.config.max_predator_age / 4
-
-        # Normal distribution formula: f(x) = (1/(σ√(2π))) * e^(-((x-μ)^2/(2σ^2)))
-        coefficient = 1 / (std_dev * math.sqrt(2 * math.pi))
-        exponent = -((self.age - mean) ** 2) / (2 * std_dev ** 2)
-
-        # Calculate the distribution value
-        distribution = coefficient * math.exp(exponent)
-
-        # Scale to return 1 at the peak (when age equals mean)
-        max_distribution = coefficient  # Value of f(x) when x = mean
-        scaled_value = distribution / max_distribution
-        return round(scaled_value, 4)
+        # Normal distribution over age, 1 at half the max age; looked up in a table built once per config
+        return gaussian_age_table(self.config.max_predator_age).probability(self.age)
 
     def check_age(self):
         # Handle aging logic and dying from old age
         if self.ticks % 60 == 0:  # Check age every 60 ticks
-            self.age += 1
+            self.grow_older()
             if self.age >= self.config.max_predator_age:
                 self.kill()
 
@@ -84,11 +79,10 @@ class Predator(Agent[PredatorPreyConfig]):
 
     def detect_prey(self):
         # Check if there are any Prey agents in proximity
-        for neighbor in self.in_proximity_performance():
-            if isinstance(neighbor, Prey):
-                if neighbor.is_alive() and probability(self.calculate_hunt_success()):
-                    neighbor.kill()
-                    return True
+        for neighbor in self.in_proximity_of(Prey):
+            if neighbor.is_alive() and probability(self.calculate_hunt_success()):
+                neighbor.kill()
+                return True
         return False
 
     def hunt_prey(self) -> None:
@@ -109,10 +103,14 @@ class Predator(Agent[PredatorPreyConfig]):
                 self.reproduced_ticks_ago = 0
 
 
+    def save_snapshot(self) -> None:
+        if self.config.snapshots:
+            self.save_data('kind', self.kind)
+            self.save_data('age', self.age)
+
     def update(self) -> None:
         self.ticks += 1
-        self.save_data('kind', 'predator')
-        self.save_data('age', self.age)
+        self.save_snapshot()
         self.check_age()
         self.update_energy()
         self.hunt_prey()
@@ -127,7 +125,9 @@ class Predator(Agent[PredatorPreyConfig]):
 
 
 
-class Prey(Agent[PredatorPreyConfig]):
+class Prey(Counted, Agent[PredatorPreyConfig]):
+    kind = 'prey'
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.age = 0  # Age of the prey
@@ -135,26 +135,8 @@ class Prey(Agent[PredatorPreyConfig]):
         self.last_reproduced_ticks = 0  # Ticks since last reproduction
 
     def calculate_breeding_chance(self) -> float:
-        if self.age < 0 or self.config.max_prey_age <= 0 or self.age > self.config.max_prey_age:
-            return 0.0
-
-        # Mean is at the midpoint of max_age
-        mean = self.config.max_prey_age / 2
-        # Standard deviation is set to max_age/4 for a reasonable spread
-        std_dev = self.config.max_prey_age / 4
-
-        # Normal distribution formula: f(x) = (1/(σ√(2π))) * e^(-((x-μ)^2/(2σ^2)))
-        coefficient = 1 / (std_dev * math.sqrt(2 * math.pi))
-        exponent = -((self.age - mean) ** 2) / (2 * std_dev ** 2)
-
-        # Calculate the distribution value
-        distribution = coefficient * math.exp(exponent)
-
-        # Scale to return max_breed_chance at the peak (when age equals mean)
-        max_distribution = coefficient  # Value of f(x) when x = mean
-        scaled_value = (distribution / max_distribution) * self.config.prey_max_breeding_chance
-
-        return round(scaled_value, 4)
+        # Normal distribution over age, prey_max_breeding_chance at half the max age; looked up in a table built once per config
+        return gaussian_age_table(self.config.max_prey_age, self.config.prey_max_breeding_chance).probability(self.age)
 
 
     def update_breed(self) -> None:
@@ -168,15 +150,19 @@ class Prey(Agent[PredatorPreyConfig]):
     def check_age(self):
         # Handle aging logic and dying from old age
         if self.ticks % 60 == 0:  # Check age every 60 ticks
-            self.age += 1
+            self.grow_older()
             if self.age >= self.config.max_prey_age:
                 self.kill()
 
 
+    def save_snapshot(self) -> None:
+        if self.config.snapshots:
+            self.save_data('kind', self.kind)
+            self.save_data('age', self.age)
+
     def update(self) -> None:
         self.ticks += 1
-        self.save_data('kind', 'prey')
-        self.save_data('age', self.age)
+        self.save_snapshot()
         self.check_age()
         self.update_breed()
         self.pos += self.move * self.config.movement_speed
@@ -184,33 +170,53 @@ class Prey(Agent[PredatorPreyConfig]):
 
 def run_sim():
         time_start = time.time()
-        sim = (
-            HeadlessSimulation(PredatorPreyConfig())
-            .batch_spawn_agents(2000, Prey, images=["../images/prey.png"])
-            .batch_spawn_agents(25, Predator, images=["../images/predator.png"])
-            .run()
-            .snapshots
-
-        )
+        config = PredatorPreyConfig()
+        if config.engine == "arrays":
+            return run_arrays(config)
+        simulation = HeadlessSimulation(config)
+        # Predators look up the prey in their chunk directly instead of filtering all neighbours.
+        use_typed_proximity(simulation)
+        simulation.batch_spawn_agents(2000, Prey, images=["../images/prey.png"])
+        simulation.batch_spawn_agents(25, Predator, images=["../images/predator.png"])
+        # Per-agent snapshots, only when asked for, go straight to disk in chunks.
+        sink = use_snapshot_sink(simulation, config.snapshots) if config.snapshots else None
+        # Counts and age histograms per kind, kept by the agents as they are born, age and die.
+        population = use_population_counter(simulation, kinds=('predator', 'prey'),
+                                            max_age=max(config.max_predator_age, config.max_prey_age),
+                                            keep_snapshots=sink is not None)
+        simulation.run()
         time_end = time.time()
-        print(sim.head(10))
-
-        aggreg = sim.group_by("frame", maintain_order=True).agg([
-            pl.col("kind").value_counts().alias("count"),
-        ])
-
-        frames = aggreg['frame'].to_list()
+        stats = population.frame()
+        print(stats.head(10))
+        if sink is not None:
+            sink.close()
+            print(scan_snapshots(config.snapshots)
+                  .group_by("frame", "kind").agg(pl.col("age").mean().alias("mean_age"))
+                  .sort("frame", "kind")
+                  .collect(engine="streaming")
+                  .head(10))
+
+        plot_counts(population, stats)
+
+
+def run_arrays(config):
+        # Prey and predators as rows of typed arrays: births and deaths without sprites.
+        population = PopulationCounter(kinds=('predator', 'prey'),
+                                       max_age=max(config.max_predator_age, config.max_prey_age))
+        engine = PredatorPreyEngine.spawn(config, 2000, 25, "../images/prey.png", "../images/predator.png",
+                                          seed=config.seed)
+        engine.run(config.duration + 1, population)
+        stats = population.frame()
+        print(stats.head(10))
+        plot_counts(population, stats)
+
+
+def plot_counts(population, stats):
+        frames = population.frames[:population.samples].tolist()
         simulation_run_data = {}
-        predator_counts = []
-        prey_counts = []
-        predator_age_avg = []
-        prey_age_avg = []
-
-        for counts in aggreg['count']:
-            pred = next((item['count'] for item in counts if item['kind'] == 'predator'), 0)
-            prey = next((item['count'] for item in counts if item['kind'] == 'prey'), 0)
-            predator_counts.append(pred)
-            prey_counts.append(prey)
+        predator_counts, prey_counts = (column.tolist() for column in population.counts().T)
+        predator_age_avg = stats.filter(pl.col('kind') == 'predator')['mean_age'].to_list()
+        prey_age_avg = stats.filter(pl.col('kind') == 'prey')['mean_age'].to_list()
 
 
         for x in range(len(predator_counts)):
@@ -1,8 +1,13 @@
 import random
 from dataclasses import dataclass, field
+from pathlib import Path
+import sys
 from vi import Agent, Config, Simulation, Window, HeadlessSimulation
 from vi.util import count, probability
 
+sys.path.append(str(Path(__file__).resolve().parent.parent / "Common"))
+from typed_proximity import TypedQueries, use_typed_proximity
+
 @dataclass
 class PredatorPreyConfig(Config):
     width : int = 100
@@ -23,7 +28,7 @@ class PredatorConfig(Config):
     duration : int = 5001
 
 
-class Predator(Agent[PredatorConfig]):
+class Predator(TypedQueries, Agent[PredatorConfig]):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.state = "wander"  # Initial state
@@ -42,9 +47,8 @@ class Predator(Agent[PredatorConfig]):
 
     def detect_prey(self):
         # Check if there are any Prey agents in proximity
-        for neighbor in self.in_proximity_performance():
-            if isinstance(neighbor, Prey):
-                return neighbor
+        for neighbor in self.in_proximity_of(Prey):
+            return neighbor
 
         return False
 
@@ -104,8 +108,10 @@ class Prey(Agent[PredatorPreyConfig]):
         self.pos += self.move * self.speed
 
 def run_sim():
+    simulation = Simulation(PredatorPreyConfig())
+    use_typed_proximity(simulation)
     (
-        Simulation(PredatorPreyConfig())
+        simulation
         .batch_spawn_agents(100, Prey, images=["../images/prey.png"])
         .batch_spawn_agents(10, Predator, images=["../images/predator.png"])
         .run()
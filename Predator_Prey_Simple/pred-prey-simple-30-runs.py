@@ -6,6 +6,13 @@ from vi.util import count, probability
 import polars as pl
 import matplotlib.pyplot as plt
 import time
+from pathlib import Path
+import sys
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / "Common"))
+from population import Counted, use_population_counter
+from typed_proximity import TypedQueries, use_typed_proximity
+
 @dataclass
 class PredatorPreyConfig(Config):
     width : int = 100
@@ -29,7 +36,9 @@ class CustomSimulation(Simulation):
         super().__init__(*args, **kwargs)
 
 
-class Predator(Agent[PredatorPreyConfig]):
+class Predator(Counted, TypedQueries, Agent[PredatorPreyConfig]):
+    kind = 'predator'
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.death_chance = 0.05  # Chance of dying from starvation
@@ -40,11 +49,10 @@ class Predator(Agent[PredatorPreyConfig]):
 
     def detect_prey(self):
         # Check if there are any Prey agents in proximity
-        for neighbor in self.in_proximity_performance():
-            if isinstance(neighbor, Prey):
-                if neighbor.is_alive():
-                    neighbor.kill()
-                    return True
+        for neighbor in self.in_proximity_of(Prey):
+            if neighbor.is_alive():
+                neighbor.kill()
+                return True
         return False
 
     def hunt_prey(self) -> None:
@@ -58,14 +66,15 @@ class Predator(Agent[PredatorPreyConfig]):
 
 
     def update(self) -> None:
-        self.save_data('kind', 'predator')
         self.hunt_prey()
 
         self.pos += self.move * self.config.movement_speed
 
 
 
-class Prey(Agent[PredatorPreyConfig]):
+class Prey(Counted, Agent[PredatorPreyConfig]):
+    kind = 'prey'
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.reproduction_chance = 0.005  # Percentage chance to reproduce
@@ -83,7 +92,6 @@ class Prey(Agent[PredatorPreyConfig]):
 
     def update(self) -> None:
         global prey_killed_this_tick
-        self.save_data('kind', 'prey')
         self.update_breed()
         self.pos += self.move * self.config.movement_speed
 
@@ -100,32 +108,21 @@ def run_sim():
     for i in range(highest_key, 30):
         print('starting simulation', i+1)
         time_start = time.time()
-        sim = (
-            HeadlessSimulation(PredatorPreyConfig())
-            .batch_spawn_agents(2000, Prey, images=["../images/prey.png"])
-            .batch_spawn_agents(25, Predator, images=["../images/predator.png"])
-            .run()
-            .snapshots
-
-        )
+        simulation = HeadlessSimulation(PredatorPreyConfig())
+        # Predators look up the prey in their chunk directly instead of filtering all neighbours.
+        use_typed_proximity(simulation)
+        simulation.batch_spawn_agents(2000, Prey, images=["../images/prey.png"])
+        simulation.batch_spawn_agents(25, Predator, images=["../images/predator.png"])
+        # Counts per kind, kept by the agents as they are born and die; no per-agent snapshot rows.
+        population = use_population_counter(simulation, kinds=('predator', 'prey'))
+        simulation.run()
         time_end = time.time()
         print('simulation', i+1, 'completed in', time_end - time_start, 'seconds')
-        print(sim.head(10))
-
-        aggreg = sim.group_by("frame", maintain_order=True).agg([
-            pl.col("kind").value_counts().alias("count"),
-        ])
+        print(population.frame().head(10))
 
-        frames = aggreg['frame'].to_list()
+        frames = population.frames[:population.samples].tolist()
         simulation_run_data = {}
-        predator_counts = []
-        prey_counts = []
-
-        for counts in aggreg['count']:
-            pred = next((item['count'] for item in counts if item['kind'] == 'predator'), 0)
-            prey = next((item['count'] for item in counts if item['kind'] == 'prey'), 0)
-            predator_counts.append(pred)
-            prey_counts.append(prey)
+        predator_counts, prey_counts = (column.tolist() for column in population.counts().T)
 
         print(f"Predator counts: {predator_counts}")
         print(f"Prey counts: {prey_counts}")